@@ -0,0 +1,757 @@
+#!/usr/bin/env python3
+"""
+Бенчмарк синхронизации против имитации сервера Immich
+
+Поднимает локальный HTTP-сервер (stdlib), повторяющий нужные эндпоинты из
+assets/immich-openapi.json, наполняет его синтетическими данными заданного
+размера и запускает PeopleAlbumsSync.run против него. В отчет попадают время,
+число запросов, трафик и пиковый RSS.
+
+Пример:
+    python bench.py --assets 1000000 --people 5000 --albums 500 --mappings 100 --runs 2
+"""
+
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import logging
+import argparse
+import tempfile
+import threading
+import multiprocessing
+from array import array
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit, parse_qs
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None
+
+import yaml
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+BENCH_API_KEY = "bench-api-key"
+OWNER_ID = "00000000-0000-4000-8000-000000000001"
+
+# Пространства идентификаторов, чтобы ID разных сущностей не пересекались
+_ASSET_NS = 0xA55E7 << 96
+_PERSON_NS = 0x9E850 << 96
+_ALBUM_NS = 0xA1B00 << 96
+
+
+def peak_rss_kb() -> int:
+    """Пиковый RSS текущего процесса в килобайтах"""
+    if resource is None:
+        return 0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # На macOS ru_maxrss в байтах, на Linux — в килобайтах
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+class FakeImmich:
+    """Модель сервера Immich: люди, активы, альбомы и обработка API-запросов"""
+
+    def __init__(self, assets: int = 10000, people: int = 100, albums: int = 10,
+                 latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 seed: int = 42):
+        self.asset_count = assets
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.tokens = set()
+
+        # Люди: каждый 10-й без имени, каждый 50-й скрыт
+        self.people: List[Dict] = []
+        self.person_index: Dict[str, int] = {}
+        for p in range(people):
+            person_id = str(uuid.UUID(int=_PERSON_NS | p))
+            self.people.append({
+                'id': person_id,
+                'name': '' if p % 10 == 9 else f"Person {p:05d}",
+                'isHidden': p % 50 == 49,
+                'birthDate': None,
+                'thumbnailPath': f"/thumbs/{person_id}.jpeg",
+                'updatedAt': '2025-01-01T00:00:00.000Z',
+            })
+            self.person_index[person_id] = p
+
+        # Распределение активов по людям с «длинным хвостом»: немногие люди встречаются часто
+        self.person_assets: List[array] = [array('l') for _ in range(people)]
+        rng = random.Random(seed)
+        if people:
+            for i in range(assets):
+                p = int((rng.paretovariate(1.2) - 1) * people / 20) % people
+                self.person_assets[p].append(i)
+                if rng.random() < 0.3:
+                    q = rng.randrange(people)
+                    if q != p:
+                        self.person_assets[q].append(i)
+            for lst in self.person_assets:
+                lst[:] = array('l', sorted(set(lst)))
+
+        # Альбомы: заранее созданы пустые альбомы «Album NNNNN»
+        self.albums: Dict[str, Dict] = {}
+        for k in range(albums):
+            self._new_album(f"Album {k:05d}", _ALBUM_NS | k)
+        self._next_album = albums
+
+        # Очереди фоновых задач для /jobs: имя -> число активных задач (None — нет доступа)
+        self.jobs: Optional[Dict[str, int]] = {'faceDetection': 0, 'facialRecognition': 0}
+
+        self.counters: Dict[str, Dict] = {}
+        self.total_requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.errors_injected = 0
+
+    # --- данные ---------------------------------------------------------
+
+    @staticmethod
+    def asset_id(index: int) -> str:
+        return str(uuid.UUID(int=_ASSET_NS | index))
+
+    @staticmethod
+    def asset_index(asset_id: str) -> Optional[int]:
+        try:
+            value = uuid.UUID(asset_id).int
+        except (ValueError, AttributeError, TypeError):
+            return None
+        if value >> 96 != _ASSET_NS >> 96:
+            return None
+        return value & ((1 << 96) - 1)
+
+    def _new_album(self, name: str, id_int: int) -> Dict:
+        album = {
+            'id': str(uuid.UUID(int=id_int)),
+            'albumName': name,
+            'assets': set(),
+            'createdAt': '2025-01-01T00:00:00.000Z',
+        }
+        self.albums[album['id']] = album
+        return album
+
+    def _timestamp(self, index: int) -> str:
+        # Более новые активы имеют больший индекс
+        day = index % 28 + 1
+        month = (index // 28) % 12 + 1
+        year = 2000 + min(index // 336, 25)
+        return f"{year:04d}-{month:02d}-{day:02d}T12:00:00.000Z"
+
+    def _asset_dto(self, index: int, with_exif: bool, with_people: bool) -> Dict:
+        ts = self._timestamp(index)
+        asset_id = self.asset_id(index)
+        dto = {
+            'id': asset_id,
+            'deviceAssetId': f"IMG_{index:07d}.jpg",
+            'ownerId': OWNER_ID,
+            'deviceId': 'bench',
+            'libraryId': None,
+            'type': 'IMAGE',
+            'originalPath': f"/usr/src/app/upload/library/admin/IMG_{index:07d}.jpg",
+            'originalFileName': f"IMG_{index:07d}.jpg",
+            'originalMimeType': 'image/jpeg',
+            'thumbhash': '1QcSHQRnh493V4dIh4eXh1h4kJUI',
+            'fileCreatedAt': ts,
+            'fileModifiedAt': ts,
+            'localDateTime': ts,
+            'createdAt': ts,
+            'updatedAt': ts,
+            'isFavorite': index % 17 == 0,
+            'isArchived': False,
+            'isTrashed': False,
+            'isOffline': False,
+            'visibility': 'timeline',
+            'duration': '0:00:00.00000',
+            'checksum': 'c2hhMS1jaGVja3N1bS1wbGFjZWhvbGRlcg==',
+            'hasMetadata': True,
+            'duplicateId': None,
+            'resized': True,
+        }
+        if with_exif:
+            dto['exifInfo'] = {
+                'make': 'Canon', 'model': 'EOS R6', 'exifImageWidth': 6000, 'exifImageHeight': 4000,
+                'fileSizeInByte': 5242880, 'orientation': '1', 'dateTimeOriginal': ts,
+                'timeZone': 'Europe/Moscow', 'lensModel': 'RF24-105mm F4 L IS USM',
+                'fNumber': 4.0, 'focalLength': 50.0, 'iso': 400, 'exposureTime': '1/250',
+                'latitude': 55.75, 'longitude': 37.62, 'city': 'Moscow', 'state': 'Moscow',
+                'country': 'Russia', 'description': '', 'projectionType': None, 'rating': None,
+            }
+        if with_people:
+            dto['people'] = [
+                self._person_dto(p) for p, lst in enumerate(self.person_assets) if self._contains(lst, index)
+            ]
+        return dto
+
+    @staticmethod
+    def _contains(lst: array, value: int) -> bool:
+        lo, hi = 0, len(lst)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if lst[mid] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo < len(lst) and lst[lo] == value
+
+    def _person_dto(self, p: int) -> Dict:
+        return dict(self.people[p])
+
+    def _album_dto(self, album: Dict, with_assets: bool) -> Dict:
+        dto = {
+            'id': album['id'],
+            'albumName': album['albumName'],
+            'albumThumbnailAssetId': None,
+            'albumUsers': [],
+            'assetCount': len(album['assets']),
+            'createdAt': album['createdAt'],
+            'updatedAt': album['createdAt'],
+            'description': '',
+            'hasSharedLink': False,
+            'isActivityEnabled': True,
+            'ownerId': OWNER_ID,
+            'owner': {'id': OWNER_ID, 'email': 'admin@example.com', 'name': 'admin'},
+            'shared': False,
+            'assets': [],
+        }
+        if with_assets:
+            dto['assets'] = [self._asset_dto(i, True, False) for i in sorted(album['assets'])]
+        return dto
+
+    # --- обработка запросов ---------------------------------------------
+
+    def _count(self, endpoint: str, received: int, sent: int):
+        with self._lock:
+            self.total_requests += 1
+            self.bytes_in += received
+            self.bytes_out += sent
+            stats = self.counters.setdefault(endpoint, {'count': 0, 'bytes_in': 0, 'bytes_out': 0})
+            stats['count'] += 1
+            stats['bytes_in'] += received
+            stats['bytes_out'] += sent
+
+    def stats(self) -> Dict:
+        """Счетчики запросов на стороне сервера"""
+        with self._lock:
+            return {
+                'requests': self.total_requests,
+                'bytes_in': self.bytes_in,
+                'bytes_out': self.bytes_out,
+                'errors_injected': self.errors_injected,
+                'endpoints': {k: dict(v) for k, v in sorted(self.counters.items())},
+                'peak_rss_kb': peak_rss_kb(),
+            }
+
+    def reset_stats(self):
+        with self._lock:
+            self.counters = {}
+            self.total_requests = 0
+            self.bytes_in = 0
+            self.bytes_out = 0
+            self.errors_injected = 0
+
+    def _authorized(self, headers: Dict[str, str]) -> bool:
+        if headers.get('x-api-key') == BENCH_API_KEY:
+            return True
+        auth = headers.get('authorization', '')
+        return auth.startswith('Bearer ') and auth[7:] in self.tokens
+
+    def handle(self, method: str, url: str, headers: Dict[str, str], body: bytes) -> Tuple[int, bytes]:
+        """Обработать запрос; возвращает (HTTP-статус, тело ответа)"""
+        parts = urlsplit(url)
+        path = parts.path
+        query = parse_qs(parts.query)
+        headers = {k.lower(): v for k, v in headers.items()}
+        endpoint = self.endpoint(method, path)
+
+        status, payload = self._dispatch(method.upper(), path, query, headers, body)
+        data = b'' if payload is None else json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        self._count(endpoint, len(body or b''), len(data))
+        return status, data
+
+    @staticmethod
+    def endpoint(method: str, path: str) -> str:
+        segments = path.rstrip('/').split('/')
+        # /api/<collection>/<id>/... -> /api/<collection>/{id}/...
+        if len(segments) > 3 and segments[2] in ('people', 'albums') and segments[3] != 'assets':
+            segments[3] = '{id}'
+        return f"{method.upper()} {'/'.join(segments)}"
+
+    def _dispatch(self, method: str, path: str, query: Dict, headers: Dict, body: bytes):
+        if self.latency or self.jitter:
+            time.sleep(max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter)))
+
+        if method == 'POST' and path == '/api/auth/login':
+            token = uuid.uuid4().hex
+            with self._lock:
+                self.tokens.add(token)
+            return 201, {'accessToken': token, 'userId': OWNER_ID, 'userEmail': 'admin@example.com'}
+
+        if not self._authorized(headers):
+            return 401, {'message': 'Authentication required', 'statusCode': 401}
+
+        if self.error_rate:
+            with self._lock:
+                fail = self._rng.random() < self.error_rate
+                if fail:
+                    self.errors_injected += 1
+            if fail:
+                return 500, {'message': 'Injected failure', 'statusCode': 500}
+
+        try:
+            payload = json.loads(body) if body else {}
+        except ValueError:
+            return 400, {'message': 'Invalid JSON', 'statusCode': 400}
+
+        segments = [s for s in path.split('/') if s][1:]  # без 'api'
+        if not segments:
+            return 404, {'message': 'Not found', 'statusCode': 404}
+
+        handler = getattr(self, f"_api_{segments[0]}", None)
+        if handler is None:
+            return 404, {'message': 'Not found', 'statusCode': 404}
+        return handler(method, segments[1:], query, payload)
+
+    @staticmethod
+    def _flag(query: Dict, name: str) -> bool:
+        return query.get(name, ['false'])[0].lower() == 'true'
+
+    def _api_people(self, method: str, rest: List[str], query: Dict, payload: Dict):
+        if method != 'GET':
+            return 404, {'message': 'Not found', 'statusCode': 404}
+        if rest:
+            p = self.person_index.get(rest[0])
+            if p is None:
+                return 400, {'message': 'Person not found', 'statusCode': 400}
+            return 200, self._person_dto(p)
+        with_hidden = self._flag(query, 'withHidden')
+        page = int(query.get('page', ['1'])[0])
+        size = min(int(query.get('size', ['500'])[0]), 1000)
+        visible = [person for person in self.people if with_hidden or not person['isHidden']]
+        chunk = visible[(page - 1) * size:page * size]
+        return 200, {
+            'people': [dict(person) for person in chunk],
+            'total': len(visible),
+            'hidden': sum(1 for person in self.people if person['isHidden']),
+            'hasNextPage': page * size < len(visible),
+        }
+
+    def _api_search(self, method: str, rest: List[str], query: Dict, payload: Dict):
+        if method != 'POST' or rest != ['metadata']:
+            return 404, {'message': 'Not found', 'statusCode': 404}
+        size = int(payload.get('size', 250))
+        page = int(payload.get('page', 1))
+        if size < 1 or size > 1000:
+            return 400, {'message': ['size must not be greater than 1000'], 'statusCode': 400}
+
+        person_ids = payload.get('personIds') or []
+        if person_ids:
+            sets = []
+            for person_id in person_ids:
+                p = self.person_index.get(person_id)
+                sets.append(self.person_assets[p] if p is not None else array('l'))
+            matches = sets[0] if len(sets) == 1 else array('l', sorted(set.intersection(*map(set, sets))))
+        else:
+            matches = range(self.asset_count)
+        matches = [i for i in matches if self._matches_filters(i, payload)] if self._has_filters(payload) else matches
+
+        descending = payload.get('order', 'desc') == 'desc'
+        total = len(matches)
+        start = (page - 1) * size
+        if descending:
+            window = [matches[total - 1 - k] for k in range(start, min(start + size, total))]
+        else:
+            window = [matches[k] for k in range(start, min(start + size, total))]
+        with_exif = payload.get('withExif', True) is not False
+        with_people = bool(payload.get('withPeople', False))
+        items = [self._asset_dto(i, with_exif, with_people) for i in window]
+        return 200, {
+            'albums': {'total': 0, 'count': 0, 'items': [], 'facets': []},
+            'assets': {
+                'total': len(items),
+                'count': len(items),
+                'items': items,
+                'facets': [],
+                'nextPage': str(page + 1) if start + size < total else None,
+            },
+        }
+
+    @staticmethod
+    def _has_filters(payload: Dict) -> bool:
+        return any(k in payload for k in ('isFavorite', 'takenAfter', 'takenBefore', 'type', 'city'))
+
+    def _matches_filters(self, index: int, payload: Dict) -> bool:
+        ts = self._timestamp(index)
+        if 'isFavorite' in payload and (index % 17 == 0) != bool(payload['isFavorite']):
+            return False
+        if payload.get('takenAfter') and ts < payload['takenAfter']:
+            return False
+        if payload.get('takenBefore') and ts > payload['takenBefore']:
+            return False
+        if payload.get('type') and payload['type'] != 'IMAGE':
+            return False
+        if payload.get('city') and payload['city'] != 'Moscow':
+            return False
+        return True
+
+    def _api_jobs(self, method: str, rest: List[str], query: Dict, payload: Dict):
+        if method != 'GET' or rest:
+            return 404, {'message': 'Not found', 'statusCode': 404}
+        if self.jobs is None:
+            return 403, {'message': 'Missing required permission: job.read', 'statusCode': 403}
+        return 200, {
+            name: {
+                'jobCounts': {'active': min(active, 1), 'waiting': max(active - 1, 0), 'completed': 0,
+                              'failed': 0, 'delayed': 0, 'paused': 0},
+                'queueStatus': {'isActive': active > 0, 'isPaused': False},
+            }
+            for name, active in self.jobs.items()
+        }
+
+    def _api_albums(self, method: str, rest: List[str], query: Dict, payload: Dict):
+        if not rest:
+            if method == 'GET':
+                with self._lock:
+                    albums = list(self.albums.values())
+                return 200, [self._album_dto(album, with_assets=False) for album in albums]
+            if method == 'POST':
+                with self._lock:
+                    album = self._new_album(payload.get('albumName', ''), _ALBUM_NS | self._next_album)
+                    self._next_album += 1
+                return 201, self._album_dto(album, with_assets=False)
+            return 404, {'message': 'Not found', 'statusCode': 404}
+
+        if rest == ['assets'] and method == 'PUT':
+            album_ids = payload.get('albumIds', [])
+            asset_ids = payload.get('assetIds', [])
+            for album_id in album_ids:
+                album = self.albums.get(album_id)
+                if album is None:
+                    return 400, {'message': 'Album not found', 'statusCode': 400}
+                self._add_assets(album, asset_ids)
+            return 200, {'success': True}
+
+        album = self.albums.get(rest[0])
+        if album is None:
+            return 400, {'message': 'Album not found', 'statusCode': 400}
+        if len(rest) == 1 and method == 'GET':
+            return 200, self._album_dto(album, with_assets=not self._flag(query, 'withoutAssets'))
+        if len(rest) == 1 and method == 'PATCH':
+            if 'albumName' in payload:
+                album['albumName'] = payload['albumName']
+            return 200, self._album_dto(album, with_assets=False)
+        if rest[1:] == ['assets'] and method == 'PUT':
+            return 200, self._add_assets(album, payload.get('ids', []))
+        return 404, {'message': 'Not found', 'statusCode': 404}
+
+    def _add_assets(self, album: Dict, asset_ids: List[str]) -> List[Dict]:
+        results = []
+        with self._lock:
+            for asset_id in asset_ids:
+                index = self.asset_index(asset_id)
+                if index is None or index >= self.asset_count:
+                    results.append({'id': asset_id, 'success': False, 'error': 'not_found'})
+                elif index in album['assets']:
+                    results.append({'id': asset_id, 'success': False, 'error': 'duplicate'})
+                else:
+                    album['assets'].add(index)
+                    results.append({'id': asset_id, 'success': True})
+        return results
+
+
+class _FakeImmichHandler(BaseHTTPRequestHandler):
+    """HTTP-обработчик, передающий запросы в модель FakeImmich"""
+
+    protocol_version = 'HTTP/1.1'
+    # Заголовки и тело уходят одним пакетом, без задержек Nagle/delayed ACK
+    disable_nagle_algorithm = True
+    wbufsize = 1 << 16
+
+    def _serve(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        body = self.rfile.read(length) if length else b''
+        fake: FakeImmich = self.server.fake
+
+        if self.path.startswith('/__bench/'):
+            if self.path == '/__bench/reset':
+                fake.reset_stats()
+            status, data = 200, json.dumps(fake.stats()).encode('utf-8')
+        else:
+            status, data = fake.handle(self.command, self.path, dict(self.headers.items()), body)
+
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _serve
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeImmichAdapter(BaseAdapter):
+    """Транспорт requests, отвечающий из модели FakeImmich без сети и считающий запросы"""
+
+    def __init__(self, fake: FakeImmich):
+        super().__init__()
+        self.fake = fake
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.calls: List[str] = []
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        body = request.body or b''
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        status, data = self.fake.handle(request.method, request.url, dict(request.headers), body)
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += len(body)
+            self.bytes_received += len(data)
+            self.calls.append(self.fake.endpoint(request.method, urlsplit(request.url).path))
+
+        response = Response()
+        response.status_code = status
+        response.reason = 'OK' if status < 400 else 'Error'
+        response.headers = CaseInsensitiveDict({
+            'Content-Type': 'application/json; charset=utf-8',
+            'Content-Length': str(len(data)),
+        })
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.raw = io.BytesIO(data)
+        if not stream:
+            response._content = data
+        return response
+
+    def count(self, endpoint: str) -> int:
+        """Число запросов к эндпоинту вида 'GET /api/people'"""
+        return self.calls.count(endpoint)
+
+    def reset(self):
+        with self._lock:
+            self.requests = 0
+            self.bytes_sent = 0
+            self.bytes_received = 0
+            self.calls = []
+
+    def close(self):
+        pass
+
+
+class FakeImmichServer:
+    """Локальный HTTP-сервер с моделью FakeImmich в отдельном потоке"""
+
+    def __init__(self, fake: FakeImmich, host: str = '127.0.0.1', port: int = 0):
+        self.fake = fake
+        self.httpd = ThreadingHTTPServer((host, port), _FakeImmichHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = fake
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> 'FakeImmichServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def _serve_in_subprocess(params: Dict, ready, stop):
+    """Точка входа дочернего процесса: поднять сервер и ждать сигнала остановки"""
+    server = FakeImmichServer(FakeImmich(**params)).start()
+    ready.put(server.url)
+    stop.wait()
+    server.stop()
+
+
+def _server_request(url: str, path: str) -> Dict:
+    import requests
+    response = requests.get(f"{url}{path}", timeout=30)
+    response.raise_for_status()
+    return response.json()
+
+
+def build_config(url: str, people: List[Dict], mappings: int, options: Optional[Dict] = None) -> Dict:
+    """Сформировать конфигурацию синхронизации для первых mappings именованных людей"""
+    named = [p for p in people if p['name'] and not p['isHidden']][:mappings]
+    return {
+        'immich': {'url': url, 'api_key': BENCH_API_KEY},
+        'mappings': [
+            {
+                'person_name': p['name'],
+                'person_id': None,
+                'album_name': f"Album {int(p['name'].split()[-1]):05d}",
+                'album_id': None,
+            }
+            for p in named
+        ],
+        'options': dict({'skip_existing': True, 'max_assets_per_run': 0, 'log_level': 'WARNING'}, **(options or {})),
+    }
+
+
+def run_benchmark(assets: int = 10000, people: int = 100, albums: int = 10, mappings: int = 10,
+                  latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0, seed: int = 42,
+                  runs: int = 1, options: Optional[Dict] = None, in_process: bool = False) -> Dict:
+    """Запустить синхронизацию против имитации сервера и вернуть отчет"""
+    from main import PeopleAlbumsSync
+
+    params = dict(assets=assets, people=people, albums=albums, latency=latency,
+                  jitter=jitter, error_rate=error_rate, seed=seed)
+    report = {'params': dict(params, mappings=mappings, runs=runs), 'runs': []}
+
+    seed_start = time.perf_counter()
+    if in_process:
+        server = FakeImmichServer(FakeImmich(**params)).start()
+        url, stop, process = server.url, None, None
+    else:
+        # Сервер в отдельном процессе, чтобы его данные не искажали RSS клиента
+        ctx = multiprocessing.get_context()
+        ready, stop = ctx.Queue(), ctx.Event()
+        process = ctx.Process(target=_serve_in_subprocess, args=(params, ready, stop), daemon=True)
+        process.start()
+        url, server = ready.get(timeout=600), None
+    report['seed_seconds'] = time.perf_counter() - seed_start
+
+    config_file = None
+    try:
+        people_list = server.fake.people if server else _fetch_people(url)
+        config = build_config(url, people_list, mappings, options)
+        with tempfile.NamedTemporaryFile('w', suffix='.yaml', delete=False, encoding='utf-8') as f:
+            yaml.safe_dump(config, f, allow_unicode=True)
+            config_file = f.name
+
+        for run in range(1, runs + 1):
+            _server_request(url, '/__bench/reset')
+            sync = PeopleAlbumsSync(config_file)
+            start = time.perf_counter()
+            sync.run()
+            wall = time.perf_counter() - start
+            server_stats = _server_request(url, '/__bench/stats')
+            client_stats = sync.client.metrics.snapshot()
+            report['runs'].append({
+                'run': run,
+                'wall_seconds': round(wall, 3),
+                'requests': server_stats['requests'],
+                'bytes_to_server': server_stats['bytes_in'],
+                'bytes_from_server': server_stats['bytes_out'],
+                'errors_injected': server_stats['errors_injected'],
+                'client_http_seconds': round(client_stats['http_time'], 3),
+                'client_json_seconds': round(client_stats['json_time'], 3),
+                'endpoints': server_stats['endpoints'],
+            })
+        report['client_peak_rss_kb'] = peak_rss_kb()
+        report['server_peak_rss_kb'] = _server_request(url, '/__bench/stats')['peak_rss_kb']
+    finally:
+        if config_file:
+            os.unlink(config_file)
+        if server:
+            server.stop()
+        else:
+            stop.set()
+            process.join(timeout=10)
+    return report
+
+
+def _fetch_people(url: str) -> List[Dict]:
+    import requests
+    people, page = [], 1
+    while True:
+        response = requests.get(f"{url}/api/people", params={'withHidden': 'true', 'size': 1000, 'page': page},
+                                headers={'x-api-key': BENCH_API_KEY}, timeout=60)
+        response.raise_for_status()
+        data = response.json()
+        people.extend(data['people'])
+        if not data.get('hasNextPage'):
+            return people
+        page += 1
+
+
+def format_report(report: Dict) -> str:
+    """Текстовый отчет для консоли"""
+    p = report['params']
+    lines = [
+        f"Данные: {p['assets']} активов, {p['people']} людей, {p['albums']} альбомов, "
+        f"{p['mappings']} соответствий; задержка {p['latency'] * 1000:.0f} мс, ошибки {p['error_rate']:.1%}",
+        f"Наполнение сервера: {report['seed_seconds']:.1f} с",
+    ]
+    for run in report['runs']:
+        lines.append(
+            f"Запуск {run['run']}: {run['wall_seconds']:.2f} с, {run['requests']} запросов, "
+            f"{run['bytes_from_server'] / 1048576:.1f} МБ получено, {run['bytes_to_server'] / 1024:.1f} КБ отправлено, "
+            f"HTTP {run['client_http_seconds']:.2f} с, JSON {run['client_json_seconds']:.2f} с, "
+            f"ошибок внедрено {run['errors_injected']}"
+        )
+        for endpoint, stats in run['endpoints'].items():
+            lines.append(f"    {endpoint}: {stats['count']} запр., {stats['bytes_out'] / 1024:.1f} КБ")
+    lines.append(f"Пиковый RSS клиента: {report['client_peak_rss_kb'] / 1024:.1f} МБ, "
+                 f"сервера: {report['server_peak_rss_kb'] / 1024:.1f} МБ")
+    return '\n'.join(lines)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Аргументы бенчмарка (используются и в main.py bench)"""
+    parser.add_argument('--assets', type=int, default=100000, help="Количество активов")
+    parser.add_argument('--people', type=int, default=500, help="Количество людей")
+    parser.add_argument('--albums', type=int, default=50, help="Количество существующих альбомов")
+    parser.add_argument('--mappings', type=int, default=20, help="Количество соответствий в конфиге")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Задержка ответа сервера, мс")
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help="Разброс задержки, мс")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Доля ответов 500 (0..1)")
+    parser.add_argument('--seed', type=int, default=42, help="Зерно генератора данных")
+    parser.add_argument('--runs', type=int, default=2, help="Количество последовательных запусков")
+    parser.add_argument('--option', action='append', default=[], metavar='KEY=VALUE',
+                        help="Переопределить параметр options (значение в YAML)")
+    parser.add_argument('--json', action='store_true', help="Вывести отчет в JSON")
+
+
+def run_from_args(args: argparse.Namespace) -> Dict:
+    options = {}
+    for item in args.option:
+        key, _, value = item.partition('=')
+        options[key] = yaml.safe_load(value)
+    return run_benchmark(
+        assets=args.assets, people=args.people, albums=args.albums, mappings=args.mappings,
+        latency=args.latency_ms / 1000, jitter=args.jitter_ms / 1000, error_rate=args.error_rate,
+        seed=args.seed, runs=args.runs, options=options,
+    )
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Бенчмарк синхронизации против имитации Immich")
+    add_arguments(parser)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.WARNING)
+    report = run_from_args(args)
+    print(json.dumps(report, ensure_ascii=False, indent=2) if args.json else format_report(report))
+
+
+if __name__ == "__main__":
+    main()
@@ -4,12 +4,28 @@ Immich People Albums Sync
 Программа для автоматического добавления фотографий распознанных людей в альбомы
 """
 
+import io
 import os
+import re
+import json
+import gzip
+import codecs
 import sys
+import time
 import logging
+import argparse
+import threading
+import cProfile
+import tracemalloc
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from urllib.parse import urlsplit
 import yaml
 import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
 from requests.exceptions import HTTPError
+from requests.structures import CaseInsensitiveDict
 from typing import List, Dict, Optional
 
 # Настройка логирования
@@ -22,18 +38,643 @@ logging.basicConfig(
     ]
 )
 logger = logging.getLogger(__name__)
+# Отдельный логгер для медленных запросов, чтобы его можно было направить в свой обработчик
+slow_logger = logging.getLogger(f"{__name__}.slow")
+
+# Фазы синхронизации одного соответствия (в порядке выполнения)
+SYNC_PHASES = ('resolve_person', 'resolve_album', 'search', 'diff', 'write')
+# Очереди машинного обучения, пока они заняты, синхронизация откладывается (options.wait_for_jobs)
+FACE_JOB_QUEUES = ('faceDetection', 'facialRecognition')
+# Размер батча при добавлении активов в альбом (один PUT на батч)
+ALBUM_ADD_BATCH_SIZE = 100
+
+
+class RequestMetrics:
+    """Счетчики HTTP-запросов клиента: время сервера, разбор JSON, объем трафика"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.requests = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.http_time = 0.0
+        self.json_time = 0.0
+        self.slow_requests = 0
+        self.endpoints: Dict[str, Dict] = {}
+    
+    @staticmethod
+    def endpoint_key(method: str, path: str) -> str:
+        """Нормализовать путь запроса до шаблона эндпоинта (без ID и параметров)"""
+        path = path.split('?', 1)[0]
+        path = re.sub(r'/(people|albums)/(?!assets$)[^/]+', r'/\1/{id}', path)
+        return f"{method.upper()} {path}"
+    
+    def _thread_totals(self) -> Dict:
+        totals = getattr(self._local, 'totals', None)
+        if totals is None:
+            totals = {'requests': 0, 'http_time': 0.0, 'json_time': 0.0, 'bytes': 0}
+            self._local.totals = totals
+        return totals
+    
+    def record_request(self, endpoint: str, elapsed: float, sent: int, received: int, slow: bool = False):
+        """Учесть выполненный HTTP-запрос"""
+        with self._lock:
+            self.requests += 1
+            self.bytes_sent += sent
+            self.bytes_received += received
+            self.http_time += elapsed
+            if slow:
+                self.slow_requests += 1
+            stats = self.endpoints.setdefault(endpoint, {'count': 0, 'time': 0.0, 'max_time': 0.0, 'bytes': 0})
+            stats['count'] += 1
+            stats['time'] += elapsed
+            stats['max_time'] = max(stats['max_time'], elapsed)
+            stats['bytes'] += received
+        totals = self._thread_totals()
+        totals['requests'] += 1
+        totals['http_time'] += elapsed
+        totals['bytes'] += received
+    
+    def record_json(self, elapsed: float, received: int = 0):
+        """Учесть время разбора JSON-ответа (и байты, прочитанные потоком)"""
+        with self._lock:
+            self.json_time += elapsed
+            self.bytes_received += received
+        totals = self._thread_totals()
+        totals['json_time'] += elapsed
+        totals['bytes'] += received
+    
+    def thread_snapshot(self) -> Dict:
+        """Накопленные значения для текущего потока (для атрибуции по фазам)"""
+        return dict(self._thread_totals())
+    
+    def snapshot(self) -> Dict:
+        """Общие значения по всем потокам"""
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'bytes_sent': self.bytes_sent,
+                'bytes_received': self.bytes_received,
+                'http_time': self.http_time,
+                'json_time': self.json_time,
+                'slow_requests': self.slow_requests,
+                'endpoints': {k: dict(v) for k, v in self.endpoints.items()},
+            }
+
+
+class SyncProfiler:
+    """Замер времени (wall/CPU) по фазам синхронизации каждого соответствия"""
+    
+    def __init__(self, metrics: Optional[RequestMetrics] = None):
+        self.metrics = metrics
+        self._lock = threading.Lock()
+        self.mappings: Dict[str, Dict[str, Dict]] = {}
+    
+    @contextmanager
+    def phase(self, label: str, name: str):
+        """Замерить фазу name для соответствия label"""
+        before = self.metrics.thread_snapshot() if self.metrics else None
+        wall_start = time.perf_counter()
+        cpu_start = time.thread_time()
+        try:
+            yield
+        finally:
+            record = {
+                'wall': time.perf_counter() - wall_start,
+                'cpu': time.thread_time() - cpu_start,
+                'http': 0.0,
+                'json': 0.0,
+                'requests': 0,
+            }
+            if before is not None:
+                after = self.metrics.thread_snapshot()
+                record['http'] = after['http_time'] - before['http_time']
+                record['json'] = after['json_time'] - before['json_time']
+                record['requests'] = after['requests'] - before['requests']
+            with self._lock:
+                phases = self.mappings.setdefault(label, {})
+                current = phases.get(name)
+                if current:
+                    for key, value in record.items():
+                        current[key] += value
+                else:
+                    phases[name] = record
+    
+    @staticmethod
+    def format_phases(phases: Dict[str, Dict]) -> str:
+        """Короткая строка вида 'search 1.20с (CPU 0.10с, HTTP 1.05с, JSON 0.04с, 3 запр.)'"""
+        parts = []
+        for name in SYNC_PHASES:
+            p = phases.get(name)
+            if not p:
+                continue
+            parts.append(
+                f"{name} {p['wall']:.2f}с (CPU {p['cpu']:.2f}с, HTTP {p['http']:.2f}с, "
+                f"JSON {p['json']:.2f}с, {p['requests']} запр.)"
+            )
+        return '; '.join(parts)
+    
+    def totals(self) -> Dict[str, Dict]:
+        """Суммарные значения по фазам для всех соответствий"""
+        result: Dict[str, Dict] = {}
+        with self._lock:
+            for phases in self.mappings.values():
+                for name, record in phases.items():
+                    total = result.setdefault(name, {k: 0 for k in record})
+                    for key, value in record.items():
+                        total[key] += value
+        return result
+
+
+# Фильтры соответствий (options.filters / mappings[].filters) -> поля MetadataSearchDto
+SEARCH_FILTERS = {
+    'taken_after': 'takenAfter',
+    'taken_before': 'takenBefore',
+    'created_after': 'createdAfter',
+    'created_before': 'createdBefore',
+    'updated_after': 'updatedAfter',
+    'updated_before': 'updatedBefore',
+    'type': 'type',
+    'is_favorite': 'isFavorite',
+    'is_motion': 'isMotion',
+    'is_not_in_album': 'isNotInAlbum',
+    'visibility': 'visibility',
+    'with_deleted': 'withDeleted',
+    'city': 'city',
+    'state': 'state',
+    'country': 'country',
+    'make': 'make',
+    'model': 'model',
+    'lens_model': 'lensModel',
+    'rating': 'rating',
+    'tag_ids': 'tagIds',
+    'album_ids': 'albumIds',
+}
+SEARCH_FILTER_ENUMS = {
+    'type': ('IMAGE', 'VIDEO', 'AUDIO', 'OTHER'),
+    'visibility': ('archive', 'timeline', 'hidden', 'locked'),
+}
+
+
+def build_search_filters(filters: Optional[Dict]) -> Dict:
+    """Преобразовать фильтры из конфига в поля MetadataSearchDto (ValueError при ошибке)"""
+    result = {}
+    for key, value in (filters or {}).items():
+        if value is None:
+            continue
+        if key in SEARCH_FILTERS:
+            field = SEARCH_FILTERS[key]
+        elif key in SEARCH_FILTERS.values():
+            field = key
+        else:
+            raise ValueError(f"Неизвестный фильтр: {key}")
+        # YAML превращает 2024-01-01 в date; API ожидает строку ISO 8601
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        allowed = SEARCH_FILTER_ENUMS.get(field)
+        if allowed:
+            value = value.upper() if field == 'type' else value.lower()
+            if value not in allowed:
+                raise ValueError(f"Недопустимое значение фильтра {key}: {value} (допустимо: {', '.join(allowed)})")
+        result[field] = value
+    return result
+
+
+# Заголовки и поля JSON, которые не должны попадать в кассеты
+SECRET_HEADERS = {'x-api-key', 'authorization', 'cookie', 'set-cookie'}
+SECRET_FIELDS = {'password', 'accessToken', 'email', 'userEmail', 'apiKey', 'token'}
+SCRUBBED = '***'
+
+
+def scrub_json(value):
+    """Заменить значения секретных полей в JSON-структуре"""
+    if isinstance(value, dict):
+        return {k: (SCRUBBED if k in SECRET_FIELDS else scrub_json(v)) for k, v in value.items()}
+    if isinstance(value, list):
+        return [scrub_json(v) for v in value]
+    return value
+
+
+def _scrub_body(body, sort_keys: bool = True) -> str:
+    """Тело запроса/ответа в виде строки без секретов (ключи JSON сортируются для сравнения запросов)"""
+    if body is None:
+        return ''
+    if isinstance(body, (bytes, bytearray)):
+        body = body.decode('utf-8', errors='replace')
+    if not body:
+        return ''
+    try:
+        return json.dumps(scrub_json(json.loads(body)), ensure_ascii=False, sort_keys=sort_keys, separators=(',', ':'))
+    except ValueError:
+        return body
+
+
+def _request_path(url: str) -> str:
+    """Путь и параметры запроса без схемы и хоста"""
+    parts = urlsplit(url)
+    return f"{parts.path}?{parts.query}" if parts.query else parts.path
+
+
+class CassetteRecorder(BaseAdapter):
+    """Транспорт-обертка: пишет пары запрос/ответ (без секретов) в кассету .jsonl.gz"""
+    
+    # Сбрасывать сжатый поток на диск каждые N записей, чтобы прерванная запись оставалась читаемой
+    FLUSH_EVERY = 50
+    
+    def __init__(self, inner: BaseAdapter, path: str):
+        super().__init__()
+        self.inner = inner
+        self.path = path
+        self._lock = threading.Lock()
+        self._file = gzip.open(path, 'wt', encoding='utf-8')
+        self._file.write(json.dumps({'cassette': 1, 'recorded_at': time.time()}) + '\n')
+        self._start = time.perf_counter()
+        self.recorded = 0
+    
+    def send(self, request, **kwargs):
+        started = time.perf_counter()
+        response = self.inner.send(request, **kwargs)
+        content = response.content  # читает тело целиком; iter_content затем отдает его из памяти
+        elapsed = time.perf_counter() - started
+        
+        entry = {
+            't': round(started - self._start, 6),
+            'method': request.method,
+            'path': _request_path(request.url),
+            'body': _scrub_body(request.body),
+            'status': response.status_code,
+            'content_type': response.headers.get('Content-Type', ''),
+            'response': _scrub_body(content, sort_keys=False),
+            'elapsed': round(elapsed, 6),
+        }
+        with self._lock:
+            if self._file is not None:
+                self._file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+                self.recorded += 1
+                if self.recorded % self.FLUSH_EVERY == 0:
+                    self._file.flush()
+        return response
+    
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                logger.info(f"Кассета записана: {self.path} ({self.recorded} запросов)")
+        self.inner.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    """Транспорт, отвечающий из кассеты с исходной или масштабированной задержкой"""
+    
+    def __init__(self, path: str, latency_scale: float = 1.0):
+        super().__init__()
+        self.path = path
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._entries: Dict[tuple, deque] = {}
+        self.replayed = 0
+        self.missing = 0
+        with gzip.open(path, 'rt', encoding='utf-8') as f:
+            for line in f:
+                entry = json.loads(line)
+                if 'cassette' in entry:
+                    continue
+                key = (entry['method'], entry['path'], entry['body'])
+                self._entries.setdefault(key, deque()).append(entry)
+        logger.info(f"Кассета загружена: {path} ({sum(len(q) for q in self._entries.values())} запросов)")
+    
+    def send(self, request, stream=False, **kwargs):
+        key = (request.method, _request_path(request.url), _scrub_body(request.body))
+        with self._lock:
+            queue = self._entries.get(key)
+            if not queue:
+                self.missing += 1
+                raise requests.exceptions.ConnectionError(
+                    f"В кассете нет записи для {request.method} {key[1]}", request=request
+                )
+            # Повторяющиеся запросы получают записи по порядку; последняя запись переиспользуется
+            entry = queue.popleft() if len(queue) > 1 else queue[0]
+            self.replayed += 1
+        
+        if self.latency_scale > 0:
+            time.sleep(entry['elapsed'] * self.latency_scale)
+        
+        data = entry['response'].encode('utf-8')
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict({
+            'Content-Type': entry.get('content_type') or 'application/json',
+            'Content-Length': str(len(data)),
+        })
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.raw = io.BytesIO(data)
+        if not stream:
+            response._content = data
+        return response
+    
+    def close(self):
+        pass
+
+
+class SearchIdStreamDecoder:
+    """Инкрементальный разбор ответа /search/metadata
+    
+    Из потока байтов извлекаются только assets.items[].id и assets.nextPage: элементы
+    разбираются по одному и сразу отбрасываются, весь ответ в памяти не строится.
+    """
+    
+    # Пути, внутрь которых парсер спускается; остальные значения пропускаются целиком
+    _CONTAINERS = {(): '{', ('assets',): '{', ('assets', 'items'): '['}
+    _WHITESPACE = ' \t\n\r'
+    
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        # Стек открытых контейнеров: [путь, тип ('{' или '['), состояние]
+        self._stack: List[list] = []
+        self._done = False
+        self._finished = False
+        self._pending_key: Optional[str] = None
+        self.ids: List[str] = []
+        self.next_page = None
+        self.bytes = 0
+    
+    def feed(self, chunk: bytes):
+        """Добавить очередную порцию байтов ответа"""
+        self.bytes += len(chunk)
+        self._buf += self._text.decode(chunk)
+        self._parse()
+    
+    def close(self):
+        """Завершить разбор; ValueError, если ответ неполный или некорректный"""
+        self._buf += self._text.decode(b'', final=True)
+        self._finished = True
+        self._parse()
+        if not self._done:
+            raise ValueError("Неполный JSON-ответ поиска")
+    
+    def _skip_ws(self):
+        buf, pos = self._buf, self._pos
+        while pos < len(buf) and buf[pos] in self._WHITESPACE:
+            pos += 1
+        self._pos = pos
+    
+    def _decode_value(self):
+        """Разобрать значение целиком; None, если данных пока не хватает"""
+        try:
+            value, end = self._decoder.raw_decode(self._buf, self._pos)
+        except ValueError:
+            if self._finished:
+                raise
+            return None
+        # Число в конце буфера может продолжиться в следующей порции
+        if end >= len(self._buf) and not self._finished:
+            return None
+        self._pos = end
+        return (value,)
+    
+    def _value_done(self, path: tuple, value):
+        if path[:2] == ('assets', 'items') and len(path) == 3:
+            if isinstance(value, dict) and 'id' in value:
+                self.ids.append(value['id'])
+        elif path == ('assets', 'nextPage'):
+            self.next_page = value
+    
+    def _start_value(self, path: tuple) -> bool:
+        """Начать значение по пути path; False, если нужно больше данных"""
+        self._skip_ws()
+        if self._pos >= len(self._buf):
+            return False
+        opener = self._CONTAINERS.get(path)
+        if opener is not None and self._buf[self._pos] == opener:
+            self._pos += 1
+            self._stack.append([path, opener, 'first'])
+            return True
+        decoded = self._decode_value()
+        if decoded is None:
+            return False
+        self._value_done(path, decoded[0])
+        if not self._stack:
+            self._done = True
+        return True
+    
+    def _parse(self):
+        while not self._done:
+            if not self._stack:
+                if not self._start_value(()):
+                    break
+                continue
+            frame = self._stack[-1]
+            path, kind, state = frame
+            self._skip_ws()
+            if self._pos >= len(self._buf):
+                break
+            char = self._buf[self._pos]
+            closer = '}' if kind == '{' else ']'
+            
+            if state == 'after' or (state == 'first' and char == closer):
+                if char == closer:
+                    self._pos += 1
+                    self._stack.pop()
+                    if not self._stack:
+                        self._done = True
+                    continue
+                if char != ',':
+                    raise ValueError(f"Ожидалась ',' в позиции {self._pos}")
+                self._pos += 1
+                frame[2] = 'next'
+                continue
+            
+            if kind == '[':
+                if not self._start_value(path + ('*',)):
+                    break
+                frame[2] = 'after'
+                continue
+            
+            # Объект: ключ, двоеточие, значение
+            if self._pending_key is None:
+                if char != '"':
+                    raise ValueError(f"Ожидался ключ в позиции {self._pos}")
+                decoded = self._decode_value()
+                if decoded is None:
+                    break
+                self._pending_key = decoded[0]
+                self._skip_ws()
+            if self._pos >= len(self._buf):
+                break
+            if frame[2] != 'colon':
+                if self._buf[self._pos] != ':':
+                    raise ValueError(f"Ожидалось ':' в позиции {self._pos}")
+                self._pos += 1
+                frame[2] = 'colon'
+            key = self._pending_key
+            if not self._start_value(path + (key,)):
+                break
+            self._pending_key = None
+            frame[2] = 'after'
+        
+        # Отбрасываем уже разобранную часть буфера
+        if self._pos > 65536:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+
+
+class TokenBucket:
+    """Ограничение скорости «ведро токенов»: rate токенов в секунду, запас capacity
+    
+    acquire(n) ждет, пока в ведре наберется n токенов. charge(n) списывает токены
+    задним числом (например, байты уже полученного ответа) и может увести ведро в долг,
+    который следующие acquire отрабатывают ожиданием.
+    """
+    
+    def __init__(self, rate: float, capacity: Optional[float] = None, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.capacity = float(capacity) if capacity else max(self.rate, 1.0)
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._stamp = clock()
+        self.waited = 0.0
+    
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._stamp) * self.rate)
+        self._stamp = now
+    
+    def acquire(self, amount: float = 1.0):
+        """Взять amount токенов, дождавшись пополнения (amount=0 — только погасить долг)"""
+        need = min(amount, self.capacity)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= need:
+                    self._tokens -= amount
+                    return
+                delay = (need - self._tokens) / self.rate
+                self.waited += delay
+            self._sleep(delay)
+    
+    def charge(self, amount: float):
+        """Списать токены без ожидания"""
+        with self._lock:
+            self._refill()
+            self._tokens -= amount
+
+
+class AdaptiveConcurrency:
+    """AIMD-регулятор числа одновременных запросов к серверу
+    
+    Пока p95 задержки в окне из window запросов ниже target_latency, лимит растет на 1
+    (до maximum); при росте задержки, ответе 429 или 5xx — уменьшается вдвое (до minimum).
+    """
+    
+    def __init__(self, maximum: int, target_latency: float = 1.0, minimum: int = 1, window: int = 20):
+        self.maximum = max(1, int(maximum))
+        self.minimum = max(1, min(int(minimum), self.maximum))
+        self.target_latency = target_latency
+        self.window = window
+        self.limit = float(max(self.minimum, self.maximum // 2))
+        self.in_flight = 0
+        self.decreases = 0
+        self._samples: List[float] = []
+        # После снижения ответы на уже отправленные запросы не снижают лимит повторно
+        self._hold = 0
+        self._cond = threading.Condition()
+    
+    def acquire(self):
+        """Дождаться свободного слота"""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+    
+    def release(self, elapsed: float, ok: bool = True):
+        """Освободить слот и учесть результат запроса"""
+        with self._cond:
+            self.in_flight -= 1
+            if self._hold > 0:
+                self._hold -= 1
+            elif not ok:
+                self._decrease()
+            else:
+                self._samples.append(elapsed)
+                if len(self._samples) >= self.window:
+                    samples = sorted(self._samples)
+                    p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))]
+                    if p95 > self.target_latency:
+                        self._decrease()
+                    else:
+                        self.limit = min(float(self.maximum), self.limit + 1)
+                    self._samples = []
+            self._cond.notify_all()
+    
+    def _decrease(self):
+        self.limit = max(float(self.minimum), self.limit / 2)
+        self.decreases += 1
+        self._samples = []
+        self._hold = self.in_flight
+    
+    def snapshot(self) -> Dict:
+        with self._cond:
+            return {'limit': int(self.limit), 'in_flight': self.in_flight, 'decreases': self.decreases}
 
 
 class ImmichClient:
     """Клиент для работы с Immich API"""
     
-    def __init__(self, base_url: str, api_key: Optional[str] = None, email: Optional[str] = None, password: Optional[str] = None):
+    def __init__(self, base_url: str, api_key: Optional[str] = None, email: Optional[str] = None, password: Optional[str] = None,
+                 slow_request_threshold: float = 0, record_path: Optional[str] = None,
+                 replay_path: Optional[str] = None, replay_latency_scale: float = 1.0,
+                 stream_json: bool = False, pool_size: int = 0, rate_limit: float = 0,
+                 bandwidth_limit: float = 0, adaptive_concurrency: int = 0, target_latency: float = 1.0):
         self.base_url = base_url.rstrip('/')
         self.api_url = f"{self.base_url}/api"
         self.session = requests.Session()
         self.api_key = api_key
         self.email = email
         self.password = password
+        # Запросы дольше порога (в секундах) попадают в лог медленных запросов; 0 = выключено
+        self.slow_request_threshold = slow_request_threshold
+        self.metrics = RequestMetrics()
+        # Потоковый разбор ответов поиска (меньше пиковой памяти на больших страницах)
+        self.stream_json = stream_json
+        
+        # Пул соединений под параллельную синхронизацию (у requests по умолчанию 10)
+        if pool_size > requests.adapters.DEFAULT_POOLSIZE and \
+                isinstance(self.session.get_adapter(self.api_url), HTTPAdapter):
+            self._mount(HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+        
+        # Защита сервера: лимит запросов/с и байт/с, адаптивное число одновременных запросов
+        self.request_limiter = TokenBucket(rate_limit) if rate_limit > 0 else None
+        self.bandwidth_limiter = TokenBucket(bandwidth_limit) if bandwidth_limit > 0 else None
+        self.concurrency: Optional[AdaptiveConcurrency] = None
+        if adaptive_concurrency > 0:
+            self.concurrency = AdaptiveConcurrency(adaptive_concurrency, target_latency=target_latency)
+        
+        # Кэши каталогов людей и альбомов: один запрос на запуск вместо одного на соответствие
+        self._cache_lock = threading.RLock()
+        self._people_catalog: Dict[bool, List[Dict]] = {}
+        self._album_catalog: Optional[List[Dict]] = None
+        
+        if not api_key and not (email and password):
+            raise ValueError("Необходимо указать либо api_key, либо email/password")
+        
+        # Запись трафика в кассету или воспроизведение из нее (до аутентификации, чтобы попал и логин)
+        self.recorder: Optional[CassetteRecorder] = None
+        self.replayer: Optional[ReplayAdapter] = None
+        if replay_path:
+            self.replayer = ReplayAdapter(replay_path, latency_scale=replay_latency_scale)
+            self._mount(self.replayer)
+        elif record_path:
+            self.recorder = CassetteRecorder(self.session.get_adapter(self.api_url), record_path)
+            self._mount(self.recorder)
         
         # Настройка аутентификации
         if api_key:
@@ -43,15 +684,78 @@ class ImmichClient:
         else:
             raise ValueError("Необходимо указать либо api_key, либо email/password")
     
+    def _mount(self, adapter: BaseAdapter):
+        """Направить все запросы к серверу через указанный транспорт"""
+        self.session.mount(f"{self.base_url}/", adapter)
+    
+    def close(self):
+        """Закрыть сессию (и дописать кассету, если идет запись)"""
+        self.session.close()
+        if self.recorder is not None:
+            self.recorder.close()
+    
+    @staticmethod
+    def _payload_size(value) -> int:
+        """Размер тела запроса/ответа в байтах (0, если определить нельзя)"""
+        if isinstance(value, (bytes, bytearray)):
+            return len(value)
+        if isinstance(value, str):
+            return len(value.encode('utf-8'))
+        return 0
+    
+    def _request(self, method: str, path: str, **kwargs):
+        """Выполнить HTTP-запрос к API с учетом метрик и лога медленных запросов"""
+        url = f"{self.api_url}{path}"
+        endpoint = RequestMetrics.endpoint_key(method, path)
+        if self.request_limiter is not None:
+            self.request_limiter.acquire()
+        if self.bandwidth_limiter is not None:
+            self.bandwidth_limiter.acquire(0)
+        if self.concurrency is not None:
+            self.concurrency.acquire()
+        ok = False
+        start = time.perf_counter()
+        try:
+            response = getattr(self.session, method)(url, **kwargs)
+            status = getattr(response, 'status_code', None)
+            ok = not (isinstance(status, int) and (status == 429 or status >= 500))
+        finally:
+            elapsed = time.perf_counter() - start
+            if self.concurrency is not None:
+                self.concurrency.release(elapsed, ok)
+        
+        request = getattr(response, 'request', None)
+        sent = self._payload_size(getattr(request, 'body', None))
+        received = 0 if kwargs.get('stream') else self._payload_size(getattr(response, 'content', None))
+        if self.bandwidth_limiter is not None:
+            # Размер ответа известен только после получения: списываем задним числом
+            self.bandwidth_limiter.charge(sent + received)
+        slow = bool(self.slow_request_threshold) and elapsed >= self.slow_request_threshold
+        self.metrics.record_request(endpoint, elapsed, sent, received, slow=slow)
+        if slow:
+            slow_logger.warning(
+                f"Медленный запрос: {endpoint} — {elapsed:.2f} с "
+                f"(HTTP {getattr(response, 'status_code', '?')}, {received} байт)"
+            )
+        return response
+    
+    def _json(self, response):
+        """Разобрать JSON-ответ, учитывая время разбора"""
+        start = time.perf_counter()
+        data = response.json()
+        self.metrics.record_json(time.perf_counter() - start)
+        return data
+    
     def _login(self, email: str, password: str):
         """Аутентификация через email/password"""
         try:
-            response = self.session.post(
-                f"{self.api_url}/auth/login",
+            response = self._request(
+                'post',
+                "/auth/login",
                 json={"email": email, "password": password}
             )
             response.raise_for_status()
-            data = response.json()
+            data = self._json(response)
             # Сохраняем токен для последующих запросов
             if 'accessToken' in data:
                 self.session.headers.update({'Authorization': f"Bearer {data['accessToken']}"})
@@ -60,8 +764,20 @@ class ImmichClient:
             logger.error(f"Ошибка аутентификации: {e}")
             raise
     
-    def get_all_people(self, with_hidden: bool = False) -> List[Dict]:
-        """Получить список всех людей"""
+    def get_all_people(self, with_hidden: bool = False, refresh: bool = False) -> List[Dict]:
+        """Получить список всех людей (кэшируется до refresh=True или invalidate_caches)"""
+        with self._cache_lock:
+            if not refresh and with_hidden in self._people_catalog:
+                return self._people_catalog[with_hidden]
+            people = self._fetch_people(with_hidden)
+            # Ошибку не кэшируем, чтобы следующий вызов повторил запрос
+            if people is None:
+                return []
+            self._people_catalog[with_hidden] = people
+            return people
+    
+    def _fetch_people(self, with_hidden: bool) -> Optional[List[Dict]]:
+        """Запросить список людей с сервера (None при ошибке)"""
         try:
             # Формируем параметры запроса
             # Не передаем withHidden если он False, чтобы избежать проблем с некоторыми версиями API
@@ -69,14 +785,20 @@ class ImmichClient:
             if with_hidden:
                 params["withHidden"] = True  # Передаем как boolean, requests преобразует правильно
             
-            logger.debug(f"Запрос к {self.api_url}/people с параметрами: {params}")
-            response = self.session.get(
-                f"{self.api_url}/people",
-                params=params
-            )
-            response.raise_for_status()
-            data = response.json()
-            return data.get('people', [])
+            people = []
+            page = 1
+            while True:
+                if page > 1:
+                    params["page"] = page
+                logger.debug(f"Запрос к {self.api_url}/people с параметрами: {params}")
+                response = self._request('get', "/people", params=params)
+                response.raise_for_status()
+                data = self._json(response)
+                people.extend(data.get('people', []))
+                # hasNextPage есть начиная с v1.110.0; на старых серверах одна страница
+                if data.get('hasNextPage') is not True:
+                    return people
+                page += 1
         except requests.exceptions.HTTPError as e:
             # Логируем детали ошибки для отладки
             if e.response is not None:
@@ -89,10 +811,26 @@ class ImmichClient:
                 logger.debug(f"Запрос был к: {e.response.url}")
             else:
                 logger.error(f"Ошибка получения списка людей: {e}")
-            return []
+            return None
         except Exception as e:
             logger.error(f"Ошибка получения списка людей: {e}", exc_info=True)
-            return []
+            return None
+    
+    def get_jobs(self) -> Optional[Dict]:
+        """Состояние очередей фоновых задач (/jobs, нужно право job.read); None при ошибке"""
+        try:
+            response = self._request('get', "/jobs")
+            response.raise_for_status()
+            return self._json(response)
+        except Exception as e:
+            logger.warning(f"Не удалось получить состояние задач: {e}")
+            return None
+    
+    def invalidate_caches(self):
+        """Сбросить кэши каталогов людей и альбомов"""
+        with self._cache_lock:
+            self._people_catalog = {}
+            self._album_catalog = None
     
     def find_person_by_name(self, name: str) -> Optional[Dict]:
         """Найти человека по имени"""
@@ -105,69 +843,122 @@ class ImmichClient:
     def get_person_by_id(self, person_id: str) -> Optional[Dict]:
         """Получить человека по ID"""
         try:
-            response = self.session.get(f"{self.api_url}/people/{person_id}")
+            response = self._request('get', f"/people/{person_id}")
             response.raise_for_status()
-            return response.json()
+            return self._json(response)
         except Exception as e:
             logger.error(f"Ошибка получения человека {person_id}: {e}")
             return None
     
-    def search_assets_by_person(self, person_id: str, limit: int = 1000) -> List[str]:
-        """Получить список ID активов (фото) для конкретного человека"""
+    # Поиску нужен только asset['id']: отключаем EXIF, людей и стеки в ответе
+    LEAN_SEARCH_FIELDS = {"withExif": False, "withPeople": False, "withStacked": False}
+    
+    def _search_page(self, body: Dict, enough=None) -> tuple:
+        """Запросить страницу /search/metadata; возвращает (список ID, nextPage)
+        
+        enough(ids) — при потоковом разборе чтение ответа прекращается, как только
+        функция вернет True (nextPage в этом случае не известен).
+        """
+        if not self.stream_json:
+            response = self._request('post', "/search/metadata", json=body)
+            response.raise_for_status()
+            data = self._json(response)
+            # Извлекаем ID активов из структуры ответа SearchResponseDto
+            # Ответ содержит assets.items, где items - массив AssetResponseDto
+            assets_data = data.get('assets', {})
+            assets = assets_data.get('items', [])
+            return [asset['id'] for asset in assets if 'id' in asset], assets_data.get('nextPage')
+        
+        # Потоковый разбор: ID извлекаются по мере чтения, ответ целиком не строится
+        response = self._request('post', "/search/metadata", json=body, stream=True)
+        try:
+            response.raise_for_status()
+            start = time.perf_counter()
+            decoder = SearchIdStreamDecoder()
+            for chunk in response.iter_content(chunk_size=65536):
+                decoder.feed(chunk)
+                if enough is not None and enough(decoder.ids):
+                    self.metrics.record_json(time.perf_counter() - start, received=decoder.bytes)
+                    return decoder.ids, None
+            decoder.close()
+            self.metrics.record_json(time.perf_counter() - start, received=decoder.bytes)
+            return decoder.ids, decoder.next_page
+        finally:
+            response.close()
+    
+    def search_assets_by_person(self, person_id: str, limit: int = 0, filters: Optional[Dict] = None,
+                                order: Optional[str] = None, stop_at=None, skip=None) -> List[str]:
+        """Получить список ID активов (фото) для конкретного человека
+        
+        filters — поля MetadataSearchDto (takenAfter, type, isFavorite, ...), фильтрация на сервере.
+        order — порядок по дате съемки ('desc' — сначала новые). Просмотр прекращается на первом
+        активе из stop_at; активы из skip пропускаются и не учитываются в limit. limit
+        применяется по ходу чтения: лишние страницы не запрашиваются.
+        """
         all_asset_ids = []
         page = 1
-        page_size = min(limit, 1000) if limit > 0 else 1000
+        page_size = min(limit, 1000) if limit > 0 and not skip else 1000
+        
+        def take(asset_ids: List[str]) -> bool:
+            """Отобрать активы страницы; True — просмотр закончен"""
+            for asset_id in asset_ids:
+                if stop_at and asset_id in stop_at:
+                    return True
+                if skip and asset_id in skip:
+                    continue
+                all_asset_ids.append(asset_id)
+                if limit > 0 and len(all_asset_ids) >= limit:
+                    return True
+            return False
+        
+        def enough(asset_ids: List[str]) -> bool:
+            """Достаточно ли уже разобранной части страницы (для потокового разбора)"""
+            if stop_at and any(asset_id in stop_at for asset_id in asset_ids):
+                return True
+            if limit > 0 and not skip:
+                return len(all_asset_ids) + len(asset_ids) >= limit
+            return False
+        
+        body = dict(filters or {}, **self.LEAN_SEARCH_FIELDS, personIds=[person_id], size=page_size)
+        if order:
+            body['order'] = order
         
         try:
             while True:
                 # Используем эндпоинт поиска с фильтром по personIds
-                response = self.session.post(
-                    f"{self.api_url}/search/metadata",
-                    json={
-                        "personIds": [person_id],
-                        "size": page_size,
-                        "page": page
-                    }
+                asset_ids, next_page = self._search_page(
+                    dict(body, page=page),
+                    enough if stop_at or limit > 0 else None
                 )
-                response.raise_for_status()
-                data = response.json()
-                # Извлекаем ID активов из структуры ответа SearchResponseDto
-                # Ответ содержит assets.items, где items - массив AssetResponseDto
-                assets_data = data.get('assets', {})
-                assets = assets_data.get('items', [])
                 
-                if not assets:
+                if not asset_ids:
                     break
                 
-                asset_ids = [asset['id'] for asset in assets if 'id' in asset]
-                all_asset_ids.extend(asset_ids)
-                
                 # Проверяем, есть ли следующая страница
-                next_page = assets_data.get('nextPage')
-                if not next_page or (limit > 0 and len(all_asset_ids) >= limit):
+                if take(asset_ids) or not next_page:
                     break
                 
                 page += 1
-                
-                # Ограничение по лимиту
-                if limit > 0 and len(all_asset_ids) >= limit:
-                    all_asset_ids = all_asset_ids[:limit]
-                    break
             
             return all_asset_ids
         except Exception as e:
             logger.error(f"Ошибка поиска активов для человека {person_id}: {e}")
             return all_asset_ids
     
-    def get_all_albums(self) -> List[Dict]:
-        """Получить список всех альбомов"""
-        try:
-            response = self.session.get(f"{self.api_url}/albums")
-            response.raise_for_status()
-            return response.json()
-        except Exception as e:
-            logger.error(f"Ошибка получения списка альбомов: {e}")
-            return []
+    def get_all_albums(self, refresh: bool = False) -> List[Dict]:
+        """Получить список всех альбомов (кэшируется до refresh=True или invalidate_caches)"""
+        with self._cache_lock:
+            if not refresh and self._album_catalog is not None:
+                return self._album_catalog
+            try:
+                response = self._request('get', "/albums")
+                response.raise_for_status()
+                albums = self._json(response)
+            except Exception as e:
+                logger.error(f"Ошибка получения списка альбомов: {e}")
+                return []
+            self._album_catalog = albums
+            return albums
     
     def find_album_by_name(self, name: str) -> Optional[Dict]:
         """Найти альбом по имени"""
@@ -180,24 +971,40 @@ class ImmichClient:
     def create_album(self, name: str) -> Optional[Dict]:
         """Создать новый альбом"""
         try:
-            response = self.session.post(
-                f"{self.api_url}/albums",
-                json={"albumName": name}
-            )
+            response = self._request('post', "/albums", json={"albumName": name})
             response.raise_for_status()
-            album = response.json()
+            album = self._json(response)
             logger.info(f"Создан альбом: {name} (ID: {album.get('id')})")
+            with self._cache_lock:
+                if self._album_catalog is not None:
+                    self._album_catalog.append(album)
             return album
         except Exception as e:
             logger.error(f"Ошибка создания альбома {name}: {e}")
             return None
     
+    def rename_album(self, album_id: str, name: str) -> Optional[Dict]:
+        """Переименовать альбом"""
+        try:
+            response = self._request('patch', f"/albums/{album_id}", json={"albumName": name})
+            response.raise_for_status()
+            album = self._json(response)
+            logger.info(f"Альбом {album_id} переименован в: {name}")
+            with self._cache_lock:
+                for cached in self._album_catalog or []:
+                    if cached.get('id') == album_id:
+                        cached['albumName'] = name
+            return album
+        except Exception as e:
+            logger.error(f"Ошибка переименования альбома {album_id}: {e}")
+            return None
+    
     def get_album_assets(self, album_id: str) -> List[str]:
         """Получить список ID активов в альбоме"""
         try:
-            response = self.session.get(f"{self.api_url}/albums/{album_id}")
+            response = self._request('get', f"/albums/{album_id}")
             response.raise_for_status()
-            album = response.json()
+            album = self._json(response)
             assets = album.get('assets', [])
             return [asset['id'] for asset in assets if 'id' in asset]
         except Exception as e:
@@ -210,14 +1017,11 @@ class ImmichClient:
             return True
         
         try:
-            # Разбиваем на батчи по 100 для избежания слишком больших запросов
-            batch_size = 100
+            # Разбиваем на батчи для избежания слишком больших запросов
+            batch_size = ALBUM_ADD_BATCH_SIZE
             for i in range(0, len(asset_ids), batch_size):
                 batch = asset_ids[i:i + batch_size]
-                response = self.session.put(
-                    f"{self.api_url}/albums/{album_id}/assets",
-                    json={"ids": batch}
-                )
+                response = self._request('put', f"/albums/{album_id}/assets", json={"ids": batch})
                 response.raise_for_status()
             logger.info(f"Добавлено {len(asset_ids)} активов в альбом {album_id}")
             return True
@@ -226,12 +1030,209 @@ class ImmichClient:
             return False
 
 
+class StateStore:
+    """Состояние между запусками: JSON-файлы в каталоге options.state_dir"""
+    
+    def __init__(self, state_dir: str):
+        self.state_dir = state_dir
+        self._lock = threading.RLock()
+        os.makedirs(state_dir, exist_ok=True)
+    
+    def path(self, name: str) -> str:
+        return os.path.join(self.state_dir, name)
+    
+    def load_json(self, name: str, default=None):
+        """Прочитать JSON-файл состояния (default, если файла нет или он поврежден)"""
+        with self._lock:
+            try:
+                with open(self.path(name), 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except FileNotFoundError:
+                return default
+            except (OSError, ValueError) as e:
+                logger.warning(f"Файл состояния {name} не прочитан: {e}")
+                return default
+    
+    def save_json(self, name: str, data):
+        """Атомарно записать JSON-файл состояния"""
+        with self._lock:
+            tmp_path = self.path(f".{name}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path(name))
+
+
+class SyncJournal:
+    """Журнал упреждающей записи батчей добавления активов в альбомы
+    
+    Файл journal.jsonl в каталоге состояния дописывается построчно:
+    plan — запланированные батчи соответствия, commit — батч добавлен,
+    fail — батч не добавлен (повтор в следующем запуске). При открытии журнал
+    воспроизводится и сжимается до незавершенных батчей.
+    """
+    
+    FILE = 'journal.jsonl'
+    MAX_ATTEMPTS = 5
+    
+    def __init__(self, state: StateStore):
+        self.state = state
+        self._lock = threading.Lock()
+        self._file = None
+        self.entries: Dict[str, Dict] = self._replay()
+        self.compact()
+    
+    def _replay(self) -> Dict[str, Dict]:
+        """Восстановить незавершенные батчи из журнала"""
+        entries: Dict[str, Dict] = {}
+        try:
+            with open(self.state.path(self.FILE), 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Оборванная последняя строка (процесс убит во время записи)
+                        logger.warning("Журнал: пропущена поврежденная запись")
+                        break
+                    key = record.get('key')
+                    op = record.get('op')
+                    if op == 'plan':
+                        entry = entries.setdefault(key, {'album_id': record['album_id'], 'batches': {}})
+                        entry['batches'].update({
+                            int(index): {'ids': ids, 'status': 'planned', 'attempts': 0}
+                            for index, ids in record['batches'].items()
+                        })
+                        for index, attempts in (record.get('attempts') or {}).items():
+                            entry['batches'][int(index)].update(status='failed', attempts=attempts)
+                        continue
+                    batch = entries.get(key, {}).get('batches', {}).get(record.get('batch'))
+                    if batch is None:
+                        continue
+                    if op == 'commit':
+                        del entries[key]['batches'][record['batch']]
+                    elif op == 'fail':
+                        batch['status'] = 'failed'
+                        batch['attempts'] += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Журнал не прочитан: {e}")
+        
+        for key, entry in entries.items():
+            for index, batch in list(entry['batches'].items()):
+                if batch['attempts'] >= self.MAX_ATTEMPTS:
+                    logger.error(f"Журнал: батч {key}#{index} отброшен после {batch['attempts']} попыток")
+                    del entry['batches'][index]
+        return {key: entry for key, entry in entries.items() if entry['batches']}
+    
+    def _append(self, record: Dict):
+        """Дописать запись и сбросить ее на диск до продолжения работы"""
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.state.path(self.FILE), 'a', encoding='utf-8')
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            self._file.flush()
+            os.fsync(self._file.fileno())
+    
+    def outstanding(self, key: str) -> Dict[int, Dict]:
+        """Незавершенные батчи соответствия (из прерванного запуска или очереди повтора)"""
+        with self._lock:
+            entry = self.entries.get(key)
+            return dict(entry['batches']) if entry else {}
+    
+    def plan(self, key: str, album_id: str, batches: List[List[str]]) -> Dict[int, Dict]:
+        """Записать план батчей до начала добавления (дополняет незавершенные батчи)"""
+        with self._lock:
+            entry = self.entries.setdefault(key, {'album_id': album_id, 'batches': {}})
+            start = max(entry['batches'], default=-1) + 1
+            planned = {start + offset: {'ids': ids, 'status': 'planned', 'attempts': 0}
+                       for offset, ids in enumerate(batches)}
+            entry['batches'].update(planned)
+        self._append({'op': 'plan', 'key': key, 'album_id': album_id,
+                      'batches': {index: batch['ids'] for index, batch in planned.items()}})
+        return planned
+    
+    def commit(self, key: str, index: int):
+        """Отметить батч добавленным"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry['batches'].pop(index, None)
+                if not entry['batches']:
+                    del self.entries[key]
+        self._append({'op': 'commit', 'key': key, 'batch': index})
+    
+    def fail(self, key: str, index: int):
+        """Отметить батч неудавшимся: он останется в очереди повтора"""
+        with self._lock:
+            batch = self.entries.get(key, {}).get('batches', {}).get(index)
+            if batch is not None:
+                batch['status'] = 'failed'
+                batch['attempts'] += 1
+        self._append({'op': 'fail', 'key': key, 'batch': index})
+    
+    def pending_batches(self) -> int:
+        """Число батчей, ожидающих повтора"""
+        with self._lock:
+            return sum(len(entry['batches']) for entry in self.entries.values())
+    
+    def compact(self):
+        """Переписать журнал, оставив только незавершенные батчи"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            path = self.state.path(self.FILE)
+            if not self.entries and not os.path.exists(path):
+                return
+            tmp_path = self.state.path(f".{self.FILE}.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for key, entry in self.entries.items():
+                    batches = entry['batches']
+                    f.write(json.dumps({
+                        'op': 'plan', 'key': key, 'album_id': entry['album_id'],
+                        'batches': {index: batch['ids'] for index, batch in batches.items()},
+                        'attempts': {index: batch['attempts'] for index, batch in batches.items()
+                                     if batch['status'] == 'failed'},
+                    }, ensure_ascii=False) + '\n')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+    
+    def close(self):
+        """Сжать журнал в конце запуска"""
+        self.compact()
+
+
 class PeopleAlbumsSync:
     """Основной класс для синхронизации людей с альбомами"""
     
-    def __init__(self, config_path: str = "config.yaml"):
+    def __init__(self, config_path: str = "config.yaml", profile_dir: Optional[str] = None,
+                 options_overrides: Optional[Dict] = None):
         self.config = self._load_config(config_path)
+        # Переопределения из командной строки имеют приоритет над options из файла
+        if options_overrides:
+            self.config.setdefault('options', {})
+            self.config['options'] = dict(self.config['options'] or {}, **options_overrides)
         self.client = self._create_client()
+        # Каталог для снимков cProfile/tracemalloc по каждому соответствию (режим --profile)
+        self.profile_dir = profile_dir
+        
+        state_dir = self.config.get('options', {}).get('state_dir')
+        self.state: Optional[StateStore] = StateStore(state_dir) if state_dir else None
+        # Журнал батчей добавления: возобновление прерванного запуска и очередь повтора
+        self.journal: Optional[SyncJournal] = SyncJournal(self.state) if self.state else None
+        
+        metrics = getattr(self.client, 'metrics', None)
+        self.profiler = SyncProfiler(metrics if isinstance(metrics, RequestMetrics) else None)
+        # Найденные люди и результаты поиска их активов в рамках одного запуска
+        self._person_memo: Dict[tuple, Dict] = {}
+        self._search_memo: Dict[tuple, List[str]] = {}
+        self._memo_locks: Dict[tuple, threading.Lock] = {}
+        self._memo_locks_guard = threading.Lock()
+        self._markers: Optional[Dict[str, Dict]] = None
+        # Ожидание очередей распознавания лиц (options.wait_for_jobs)
+        self._check_jobs = False
+        self._throttled = False
         
         # Устанавливаем уровень логирования из конфига
         log_level = self.config.get('options', {}).get('log_level', 'INFO')
@@ -255,81 +1256,608 @@ class PeopleAlbumsSync:
         email = immich_config.get('email')
         password = immich_config.get('password')
         url = immich_config['url']
+        options = self.config.get('options', {})
         
-        return ImmichClient(url, api_key=api_key, email=email, password=password)
+        return ImmichClient(url, api_key=api_key, email=email, password=password,
+                            slow_request_threshold=options.get('slow_request_threshold', 5.0),
+                            record_path=options.get('record_cassette'),
+                            replay_path=options.get('replay_cassette'),
+                            replay_latency_scale=options.get('replay_latency_scale', 1.0),
+                            stream_json=options.get('stream_json', False),
+                            pool_size=options.get('concurrency', 1),
+                            rate_limit=options.get('rate_limit', 0),
+                            bandwidth_limit=options.get('bandwidth_limit', 0),
+                            adaptive_concurrency=options.get('concurrency', 1)
+                            if options.get('adaptive_concurrency') else 0,
+                            target_latency=options.get('target_latency', 1.0))
+    
+    @staticmethod
+    def _mapping_label(mapping: Dict) -> str:
+        """Человекочитаемая метка соответствия для логов и отчетов"""
+        person = mapping.get('person_name') or mapping.get('person_id')
+        album = mapping.get('album_name') or mapping.get('album_id')
+        return f"{person} -> {album}"
+    
+    def _resolve_person(self, person_id: Optional[str], person_name: Optional[str]) -> Optional[Dict]:
+        """Найти человека по ID или имени; найденные люди запоминаются до конца запуска"""
+        key = ('id', person_id) if person_id else ('name', person_name)
+        with self._memo_lock(key):
+            person = self._person_memo.get(key)
+            if person is None:
+                if person_id:
+                    person = self.client.get_person_by_id(person_id)
+                else:
+                    person = self.client.find_person_by_name(person_name)
+                if person:
+                    self._person_memo[key] = person
+        return person
+    
+    def _memo_lock(self, key) -> threading.Lock:
+        """Блокировка на ключ, чтобы параллельные соответствия не дублировали запросы"""
+        with self._memo_locks_guard:
+            return self._memo_locks.setdefault(key, threading.Lock())
+    
+    def _mapping_filters(self, mapping: Dict) -> Dict:
+        """Фильтры поиска соответствия: options.filters, дополненные mappings[].filters"""
+        filters = dict(self.config.get('options', {}).get('filters') or {})
+        filters.update(mapping.get('filters') or {})
+        return build_search_filters(filters)
+    
+    def _scan_markers(self) -> Dict[str, Dict]:
+        """Отметки инкрементального просмотра: самый новый обработанный актив соответствия"""
+        with self._memo_locks_guard:
+            if self._markers is None:
+                self._markers = self.state.load_json('scan-markers.json', {}) if self.state else {}
+            return self._markers
+    
+    def _scan_options(self, marker_key: str) -> Dict:
+        """Параметры поиска для options.incremental_scan: сначала новые, до отметки прошлого запуска"""
+        options = self.config.get('options', {})
+        if not options.get('incremental_scan') or self.state is None:
+            return {}
+        marker = self._scan_markers().get(marker_key)
+        # Периодический полный просмотр находит старые фото, на которых человек распознан позже
+        interval = float(options.get('full_scan_interval', 24)) * 3600
+        if marker is None or (interval > 0 and time.time() - marker.get('full_scan_at', 0) >= interval):
+            return {'order': 'desc'}
+        return {'order': 'desc', 'stop_at': {marker['newest']}}
+    
+    def _advance_scan_marker(self, marker_key: str, scanned: List[str], full: bool):
+        """Запомнить самый новый просмотренный актив (и время полного просмотра)"""
+        markers = self._scan_markers()
+        with self._memo_locks_guard:
+            marker = dict(markers.get(marker_key) or {})
+            if scanned:
+                marker['newest'] = scanned[0]
+            if full:
+                marker['full_scan_at'] = time.time()
+            if 'newest' in marker:
+                markers[marker_key] = marker
+    
+    def _search_person_assets(self, person_id: str, filters: Optional[Dict] = None) -> List[str]:
+        """Активы человека; результат переиспользуется соответствиями с тем же человеком и фильтрами"""
+        key = (person_id, json.dumps(filters, sort_keys=True) if filters else '')
+        with self._memo_lock(('search',) + key):
+            cached = self._search_memo.get(key)
+            if cached is None:
+                if filters:
+                    cached = self.client.search_assets_by_person(person_id, filters=filters)
+                else:
+                    cached = self.client.search_assets_by_person(person_id)
+                self._search_memo[key] = cached
+        return list(cached)
     
     def sync_person_to_album(self, mapping: Dict) -> bool:
         """Синхронизировать активы человека с альбомом"""
+        plan = self._prepare_mapping(mapping)
+        if plan is None:
+            return False
+        while plan['batches']:
+            self._write_next_batch(plan)
+        return self._finish_plan(plan)
+    
+    def _prepare_mapping(self, mapping: Dict) -> Optional[Dict]:
+        """Найти человека и альбом, вычислить новые активы и разбить их на батчи
+        
+        Возвращает план записи соответствия или None при ошибке.
+        """
         person_name = mapping.get('person_name')
         person_id = mapping.get('person_id')
         album_name = mapping.get('album_name')
         album_id = mapping.get('album_id')
+        label = self._mapping_label(mapping)
+        phase = self.profiler.phase
         
         logger.info(f"Обработка: {person_name} -> {album_name}")
         
+        try:
+            filters = self._mapping_filters(mapping)
+        except ValueError as e:
+            logger.error(f"Ошибка в фильтрах соответствия {label}: {e}")
+            return None
+        
         # Находим или получаем человека
-        if person_id:
-            person = self.client.get_person_by_id(person_id)
-        else:
-            person = self.client.find_person_by_name(person_name)
+        with phase(label, 'resolve_person'):
+            person = self._resolve_person(person_id, person_name)
         
         if not person:
             logger.warning(f"Человек не найден: {person_name}")
-            return False
+            return None
         
         person_id = person['id']
         logger.info(f"Найден человек: {person_name} (ID: {person_id})")
         
         # Находим или создаем альбом
-        if album_id:
-            album = self.client.get_all_albums()
-            album = next((a for a in album if a.get('id') == album_id), None)
-        else:
-            album = self.client.find_album_by_name(album_name)
+        with phase(label, 'resolve_album'):
+            if album_id:
+                album = self.client.get_all_albums()
+                album = next((a for a in album if a.get('id') == album_id), None)
+            else:
+                album = self.client.find_album_by_name(album_name)
+            
+            if not album:
+                album = self.client.create_album(album_name)
         
         if not album:
-            album = self.client.create_album(album_name)
-            if not album:
-                logger.error(f"Не удалось создать альбом: {album_name}")
-                return False
+            logger.error(f"Не удалось создать альбом: {album_name}")
+            return None
         
         album_id = album['id']
         logger.info(f"Используется альбом: {album_name} (ID: {album_id})")
         
-        # Получаем активы человека
-        person_assets = self.client.search_assets_by_person(person_id)
+        plan = {
+            'mapping': mapping,
+            'label': label,
+            'album_id': album_id,
+            'journal_key': f"{person_id}:{album_id}",
+            'batches': deque(),
+            'assets': 0,
+            'written': 0,
+            'failed': 0,
+        }
+        
+        outstanding = self.journal.outstanding(plan['journal_key']) if self.journal is not None else {}
+        if outstanding:
+            logger.info(f"Журнал: {len(outstanding)} незавершенных батчей для {label}")
+            plan['batches'].extend((index, outstanding[index]['ids']) for index in sorted(outstanding))
+            plan['assets'] = sum(len(ids) for _, ids in plan['batches'])
+            if any(batch['status'] == 'planned' for batch in outstanding.values()):
+                # Предыдущий запуск прерван: дописываем его план без повторного поиска,
+                # новые активы будут найдены следующим запуском
+                logger.info(f"Возобновление прерванного запуска: {person_name} -> {album_name}")
+                return plan
+        
+        options = self.config.get('options', {})
+        skip_existing = options.get('skip_existing', True)
+        max_assets = options.get('max_assets_per_run', 0)
+        marker_key = f"{plan['journal_key']}:{json.dumps(filters, sort_keys=True) if filters else ''}"
+        scan = self._scan_options(marker_key)
+        search_kwargs = dict(scan)
+        if max_assets > 0 and not scan:
+            # Лимит применяется по ходу чтения, поэтому уже добавленные активы исключаются сразу
+            search_kwargs['limit'] = max_assets
+            if skip_existing:
+                with phase(label, 'diff'):
+                    search_kwargs['skip'] = set(self.client.get_album_assets(album_id))
+        
+        # Получаем активы человека (один поиск на человека за запуск)
+        with phase(label, 'search'):
+            if search_kwargs:
+                if filters:
+                    search_kwargs['filters'] = filters
+                person_assets = self.client.search_assets_by_person(person_id, **search_kwargs)
+            else:
+                person_assets = self._search_person_assets(person_id, filters)
         logger.info(f"Найдено {len(person_assets)} активов для {person_name}")
+        scanned = person_assets
         
         if not person_assets:
             logger.info(f"Нет активов для добавления")
-            return True
-        
-        # Если нужно пропускать существующие
-        skip_existing = self.config.get('options', {}).get('skip_existing', True)
-        if skip_existing:
-            existing_assets = set(self.client.get_album_assets(album_id))
-            person_assets = [aid for aid in person_assets if aid not in existing_assets]
-            logger.info(f"После фильтрации осталось {len(person_assets)} новых активов")
+            if scan:
+                self._advance_scan_marker(marker_key, scanned, full='stop_at' not in scan)
+            return plan
         
-        if not person_assets:
-            logger.info(f"Все активы уже в альбоме")
-            return True
+        with phase(label, 'diff'):
+            # Если нужно пропускать существующие
+            if skip_existing and 'skip' not in search_kwargs:
+                existing_assets = set(self.client.get_album_assets(album_id))
+                person_assets = [aid for aid in person_assets if aid not in existing_assets]
+                logger.info(f"После фильтрации осталось {len(person_assets)} новых активов")
+            if outstanding:
+                # Активы из очереди повтора уже запланированы
+                queued = {aid for _, ids in plan['batches'] for aid in ids}
+                person_assets = [aid for aid in person_assets if aid not in queued]
         
         # Ограничение по количеству активов
-        max_assets = self.config.get('options', {}).get('max_assets_per_run', 0)
-        if max_assets > 0 and len(person_assets) > max_assets:
+        truncated = max_assets > 0 and len(person_assets) > max_assets
+        if truncated:
             logger.info(f"Ограничение: добавляем только {max_assets} из {len(person_assets)} активов")
             person_assets = person_assets[:max_assets]
+        if scan and not truncated:
+            # Все новые активы попадут в план (и журнал): следующий просмотр остановится здесь
+            self._advance_scan_marker(marker_key, scanned, full='stop_at' not in scan)
         
-        # Добавляем активы в альбом
-        success = self.client.add_assets_to_album(album_id, person_assets)
+        if not person_assets:
+            if not plan['batches']:
+                logger.info(f"Все активы уже в альбоме")
+            return plan
         
-        if success:
-            logger.info(f"Успешно обработано: {person_name} -> {album_name} ({len(person_assets)} активов)")
+        batches = [person_assets[i:i + ALBUM_ADD_BATCH_SIZE]
+                   for i in range(0, len(person_assets), ALBUM_ADD_BATCH_SIZE)]
+        if self.journal is not None:
+            # План записывается в журнал до первого добавления
+            planned = self.journal.plan(plan['journal_key'], album_id, batches)
+            plan['batches'].extend((index, planned[index]['ids']) for index in sorted(planned))
         else:
+            plan['batches'].extend(enumerate(batches))
+        plan['assets'] += len(person_assets)
+        return plan
+    
+    def _write_next_batch(self, plan: Dict) -> bool:
+        """Добавить следующий батч плана в альбом и отметить его в журнале"""
+        index, ids = plan['batches'].popleft()
+        with self.profiler.phase(plan['label'], 'write'):
+            ok = self.client.add_assets_to_album(plan['album_id'], ids)
+        if self.journal is not None:
+            if ok:
+                self.journal.commit(plan['journal_key'], index)
+            else:
+                # Неудавшийся батч остается в журнале и повторяется следующим запуском
+                self.journal.fail(plan['journal_key'], index)
+        if ok:
+            plan['written'] += len(ids)
+        else:
+            plan['failed'] += 1
+            if self.journal is None:
+                # Без журнала повторить нечего: соответствие считается неудавшимся
+                plan['batches'].clear()
+        return bool(ok)
+    
+    def _finish_plan(self, plan: Dict) -> bool:
+        """Итог соответствия после записи всех батчей плана"""
+        mapping = plan['mapping']
+        person_name = mapping.get('person_name')
+        album_name = mapping.get('album_name')
+        if plan['failed'] and self.journal is None:
             logger.error(f"Ошибка при обработке: {person_name} -> {album_name}")
+            return False
+        if plan['failed']:
+            logger.warning(f"Не добавлено батчей: {plan['failed']} ({plan['label']}), "
+                           f"они будут повторены в следующем запуске")
+        if plan['written']:
+            logger.info(f"Успешно обработано: {person_name} -> {album_name} ({plan['written']} активов)")
+        return True
+    
+    def _profiled_sync(self, index: int, mapping: Dict) -> bool:
+        """Синхронизировать соответствие, сохранив снимки cProfile и tracemalloc"""
+        label = self._mapping_label(mapping)
+        slug = re.sub(r'[^\w.-]+', '_', label, flags=re.UNICODE).strip('_')[:60]
+        base = os.path.join(self.profile_dir, f"{index:03d}-{slug}")
+        os.makedirs(self.profile_dir, exist_ok=True)
         
-        return success
+        started_tracing = not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+            try:
+                return self.sync_person_to_album(mapping)
+            finally:
+                profile.disable()
+        finally:
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            if started_tracing:
+                tracemalloc.stop()
+            profile.dump_stats(f"{base}.prof")
+            with open(f"{base}.tracemalloc.txt", 'w', encoding='utf-8') as f:
+                f.write(f"# {label}\n# current={current} peak={peak}\n")
+                for stat in snapshot.statistics('lineno')[:30]:
+                    f.write(f"{stat}\n")
+            logger.info(f"Профиль сохранен: {base}.prof, {base}.tracemalloc.txt")
+    
+    def _log_run_profile(self):
+        """Вывести в лог сводку по фазам и HTTP-метрикам клиента"""
+        for label, phases in self.profiler.mappings.items():
+            logger.info(f"Фазы [{label}]: {SyncProfiler.format_phases(phases)}")
+        totals = self.profiler.totals()
+        if totals:
+            logger.info(f"Фазы (всего): {SyncProfiler.format_phases(totals)}")
+        metrics = self.profiler.metrics
+        if metrics is not None:
+            snap = metrics.snapshot()
+            logger.info(
+                f"HTTP: {snap['requests']} запросов, {snap['bytes_received']} байт получено, "
+                f"{snap['bytes_sent']} байт отправлено, сервер {snap['http_time']:.2f} с, "
+                f"JSON {snap['json_time']:.2f} с, медленных {snap['slow_requests']}"
+            )
+        controller = getattr(self.client, 'concurrency', None)
+        if isinstance(controller, AdaptiveConcurrency):
+            snap = controller.snapshot()
+            logger.info(f"Параллелизм запросов: итоговый лимит {snap['limit']}, снижений {snap['decreases']}")
+        for name in ('request_limiter', 'bandwidth_limiter'):
+            limiter = getattr(self.client, name, None)
+            if isinstance(limiter, TokenBucket) and limiter.waited:
+                logger.info(f"Ожидание лимита скорости ({name}): {limiter.waited:.2f} с")
+    
+    def _auto_mappings(self, explicit: List[Dict]) -> List[Dict]:
+        """Соответствия для режима auto: альбом на каждого именованного видимого человека"""
+        auto = self.config.get('auto') or {}
+        template = auto.get('album_template', '{name}')
+        exclude = set(auto.get('exclude') or [])
+        rename_albums = auto.get('rename_albums', True)
+        
+        # Люди, уже указанные в mappings вручную, автоматически не сопоставляются
+        taken_ids = {m.get('person_id') for m in explicit if m.get('person_id')}
+        taken_names = {m.get('person_name') for m in explicit if not m.get('person_id')}
+        
+        people = [
+            p for p in self.client.get_all_people()
+            if p.get('name') and not p.get('isHidden')
+            and p['id'] not in taken_ids and p['name'] not in taken_names
+            and p['name'] not in exclude and p['id'] not in exclude
+        ]
+        logger.info(f"Режим auto: найдено {len(people)} именованных людей")
+        
+        known = self.state.load_json('auto-albums.json', {}) if self.state else {}
+        if self.state is None:
+            logger.warning("Режим auto без options.state_dir: переименования людей не отслеживаются")
+        albums_by_id = {a.get('id'): a for a in self.client.get_all_albums()}
+        albums_by_name = {}
+        for album in albums_by_id.values():
+            albums_by_name.setdefault(album.get('albumName'), album)
+        
+        mappings = []
+        missing_names = []
+        for person in people:
+            album_name = template.format(name=person['name'], id=person['id'])
+            previous = known.get(person['id'])
+            album = albums_by_id.get(previous['album_id']) if previous else None
+            if album is not None and album.get('albumName') != album_name:
+                if previous.get('person_name') != person['name']:
+                    # Человека переименовали: используем тот же альбом, а не создаем новый
+                    logger.info(f"Переименование: {previous.get('person_name')} -> {person['name']}")
+                if previous.get('person_name') != person['name'] and rename_albums \
+                        and album_name not in albums_by_name:
+                    self.client.rename_album(album['id'], album_name)
+                else:
+                    # Альбом переименован вручную (или имя занято) — сохраняем текущее название
+                    album_name = album.get('albumName')
+            if album is None:
+                album = albums_by_name.get(album_name)
+            if album is None:
+                missing_names.append(album_name)
+            mappings.append({
+                'person_name': person['name'],
+                'person_id': person['id'],
+                'album_name': album_name,
+                'album_id': album['id'] if album else None,
+                'filters': auto.get('filters'),
+                'priority': auto.get('priority', 0),
+                'auto': True,
+            })
+            # Человек уже получен из каталога: повторно по ID не запрашиваем
+            self._person_memo[('id', person['id'])] = person
+        
+        created = self._create_albums(missing_names)
+        for mapping in mappings:
+            if mapping['album_id'] is None and mapping['album_name'] in created:
+                mapping['album_id'] = created[mapping['album_name']]['id']
+        
+        if self.state is not None:
+            for mapping in mappings:
+                if mapping['album_id']:
+                    known[mapping['person_id']] = {
+                        'album_id': mapping['album_id'],
+                        'album_name': mapping['album_name'],
+                        'person_name': mapping['person_name'],
+                    }
+            self.state.save_json('auto-albums.json', known)
+        return [m for m in mappings if m['album_id']]
+    
+    def _create_albums(self, names: List[str]) -> Dict[str, Dict]:
+        """Создать недостающие альбомы (параллельно, без повторов по имени)"""
+        names = list(dict.fromkeys(names))
+        if not names:
+            return {}
+        workers = max(1, int(self.config.get('options', {}).get('concurrency', 1)))
+        logger.info(f"Создание альбомов: {len(names)}")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            albums = list(executor.map(self.client.create_album, names))
+        return {name: album for name, album in zip(names, albums) if album}
+    
+    def _build_mappings(self) -> List[Dict]:
+        """Список соответствий на запуск: из конфига и (в режиме auto) найденные автоматически"""
+        mappings = list(self.config.get('mappings') or [])
+        if (self.config.get('auto') or {}).get('enabled'):
+            mappings.extend(self._auto_mappings(mappings))
+        return mappings
+    
+    def _sync_one(self, index: int, mapping: Dict) -> bool:
+        """Синхронизировать соответствие, перехватывая ошибки"""
+        try:
+            if self.profile_dir:
+                return self._profiled_sync(index, mapping)
+            return self.sync_person_to_album(mapping)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке соответствия: {e}", exc_info=True)
+            return False
+    
+    def _order_mappings(self, mappings: List[Dict]) -> List[Dict]:
+        """Порядок обработки: по убыванию priority, затем давно не синхронизированные первыми"""
+        last_sync = self.state.load_json('last-sync.json', {}) if self.state else {}
+        return sorted(mappings, key=lambda m: (-int(m.get('priority') or 0),
+                                               last_sync.get(self._mapping_label(m), 0)))
+    
+    def _jobs_busy(self) -> bool:
+        """Заняты ли очереди распознавания лиц (options.job_queues)
+        
+        Если /jobs недоступен (например, у ключа нет права job.read), проверка
+        отключается до конца запуска и синхронизация идет без ожидания.
+        """
+        if not self._check_jobs:
+            return False
+        jobs = self.client.get_jobs()
+        if not isinstance(jobs, dict):
+            logger.warning("Состояние задач недоступно: синхронизация без ожидания очередей")
+            self._check_jobs = False
+            return False
+        queues = self.config.get('options', {}).get('job_queues') or FACE_JOB_QUEUES
+        for name in queues:
+            queue = jobs.get(name) or {}
+            counts = queue.get('jobCounts') or {}
+            if (queue.get('queueStatus') or {}).get('isPaused'):
+                continue
+            if counts.get('active', 0) or counts.get('waiting', 0):
+                logger.info(f"Очередь {name} занята: активных {counts.get('active', 0)}, "
+                            f"ожидающих {counts.get('waiting', 0)}")
+                return True
+        return False
+    
+    def _wait_for_jobs(self) -> bool:
+        """Дождаться, пока очереди распознавания лиц опустеют; False — не дождались"""
+        options = self.config.get('options', {})
+        interval = float(options.get('job_poll_interval', 30))
+        timeout = float(options.get('job_wait_timeout', 3600))
+        until = time.monotonic() + timeout if timeout > 0 else None
+        waited = False
+        while self._jobs_busy():
+            if until is not None and time.monotonic() + interval > until:
+                return False
+            if not waited:
+                logger.info("Распознавание лиц еще идет: синхронизация отложена")
+                waited = True
+            time.sleep(interval)
+        if waited:
+            logger.info("Очереди распознавания лиц пусты: запуск синхронизации")
+        return True
+    
+    def _throttle_writes(self, throttled: bool, last_check: float) -> tuple:
+        """Пауза между батчами, пока очереди заняты; возвращает (throttled, last_check)"""
+        options = self.config.get('options', {})
+        if time.monotonic() - last_check >= float(options.get('job_poll_interval', 30)):
+            busy = self._jobs_busy()
+            if busy != throttled:
+                logger.info("Запись замедлена: сервер занят распознаванием лиц" if busy
+                            else "Очереди распознавания лиц пусты: запись без пауз")
+            throttled, last_check = busy, time.monotonic()
+        if throttled:
+            time.sleep(float(options.get('job_throttle_delay', 1.0)))
+        return throttled, last_check
+    
+    def _prepare_one(self, mapping: Dict) -> Optional[Dict]:
+        """Подготовить план соответствия, перехватывая ошибки"""
+        try:
+            return self._prepare_mapping(mapping)
+        except Exception as e:
+            logger.error(f"Ошибка при обработке соответствия: {e}", exc_info=True)
+            return None
+    
+    def _run_scheduled(self, mappings: List[Dict]) -> Dict:
+        """Подготовить соответствия и добавлять батчи по очереди между ними
+        
+        Соблюдает options.run_time_budget (секунды) и options.run_asset_budget (активы
+        за запуск): при исчерпании бюджета запуск останавливается между батчами, а
+        незаписанные батчи остаются в журнале для следующего запуска.
+        """
+        options = self.config.get('options', {})
+        concurrency = max(1, int(options.get('concurrency', 1)))
+        time_budget = float(options.get('run_time_budget', 0) or 0)
+        asset_budget = int(options.get('run_asset_budget', 0) or 0)
+        deadline = time.monotonic() + time_budget if time_budget > 0 else None
+        budget_left = asset_budget if asset_budget > 0 else None
+        executor = ThreadPoolExecutor(max_workers=concurrency) if concurrency > 1 else None
+        
+        plans: List[Optional[Dict]] = []
+        deferred: List[Dict] = []
+        stopped = None
+        try:
+            # Подготовка (поиск и сравнение) волнами по concurrency соответствий.
+            # При записи по кругу каждое соответствие получает хотя бы батч, поэтому
+            # готовить больше соответствий, чем батчей в бюджете активов, бесполезно.
+            writable = 0
+            for start in range(0, len(mappings), concurrency):
+                if deadline is not None and time.monotonic() >= deadline:
+                    stopped = 'time'
+                elif budget_left is not None and writable * ALBUM_ADD_BATCH_SIZE >= budget_left:
+                    stopped = 'assets'
+                if stopped:
+                    deferred.extend(mappings[start:])
+                    break
+                wave = mappings[start:start + concurrency]
+                if executor is not None:
+                    prepared = list(executor.map(self._prepare_one, wave))
+                else:
+                    prepared = [self._prepare_one(mapping) for mapping in wave]
+                plans.extend(prepared)
+                writable += sum(1 for plan in prepared if plan and plan['batches'])
+            
+            # Запись: по одному батчу от каждого соответствия по кругу
+            queue = deque(plan for plan in plans if plan and plan['batches'])
+            wave_time = 0.0
+            throttled, last_check = self._throttled, time.monotonic()
+            while queue and not stopped:
+                if deadline is not None and time.monotonic() + wave_time > deadline:
+                    stopped = 'time'
+                    break
+                if self._check_jobs:
+                    # Пока сервер занят распознаванием лиц, пишем по одному батчу с паузами
+                    throttled, last_check = self._throttle_writes(throttled, last_check)
+                wave = []
+                while queue and len(wave) < (1 if throttled else concurrency):
+                    plan = queue.popleft()
+                    size = len(plan['batches'][0][1])
+                    if budget_left is not None and size > budget_left:
+                        continue
+                    if budget_left is not None:
+                        budget_left -= size
+                    wave.append(plan)
+                if not wave:
+                    stopped = 'assets'
+                    break
+                started = time.perf_counter()
+                if executor is not None:
+                    list(executor.map(self._write_next_batch, wave))
+                else:
+                    for plan in wave:
+                        self._write_next_batch(plan)
+                elapsed = time.perf_counter() - started
+                wave_time = elapsed if not wave_time else 0.7 * wave_time + 0.3 * elapsed
+                queue.extend(plan for plan in wave if plan['batches'])
+        finally:
+            if executor is not None:
+                executor.shutdown()
+        
+        success_count = 0
+        completed = []
+        unfinished = 0
+        for mapping, plan in zip(mappings, plans):
+            if plan is None:
+                continue
+            if plan['batches']:
+                unfinished += 1
+                continue
+            if self._finish_plan(plan):
+                success_count += 1
+                completed.append(mapping)
+        
+        if stopped:
+            reason = 'время' if stopped == 'time' else 'лимит активов'
+            logger.warning(f"Бюджет запуска исчерпан ({reason}): не начато соответствий {len(deferred)}, "
+                           f"не завершено {unfinished}")
+            if unfinished and self.journal is None:
+                logger.warning("Без options.state_dir прогресс не сохраняется: "
+                               "оставшиеся активы будут найдены заново")
+        if self.state is not None and self._markers is not None:
+            self.state.save_json('scan-markers.json', self._markers)
+        if self.state is not None and completed:
+            last_sync = self.state.load_json('last-sync.json', {})
+            now = time.time()
+            for mapping in completed:
+                last_sync[self._mapping_label(mapping)] = now
+            self.state.save_json('last-sync.json', last_sync)
+        return {'success': success_count, 'deferred': len(deferred) + unfinished}
     
     def run(self):
         """Запустить синхронизацию"""
@@ -337,38 +1865,104 @@ class PeopleAlbumsSync:
         logger.info("Запуск синхронизации людей с альбомами")
         logger.info("=" * 60)
         
-        mappings = self.config.get('mappings', [])
+        if not self.config.get('mappings') and not (self.config.get('auto') or {}).get('enabled'):
+            logger.warning("Нет соответствий для обработки")
+            return
+        
+        options = self.config.get('options', {})
+        self._check_jobs = bool(options.get('wait_for_jobs', False))
+        self._throttled = False
+        if self._check_jobs and not self._wait_for_jobs():
+            logger.warning("Распознавание лиц не завершилось за job_wait_timeout: "
+                           "синхронизация с паузами между батчами")
+            self._throttled = True
+        
+        # Каталоги и результаты поиска актуальны в пределах одного запуска
+        self.client.invalidate_caches()
+        self._person_memo = {}
+        self._search_memo = {}
+        
+        mappings = self._build_mappings()
         if not mappings:
             logger.warning("Нет соответствий для обработки")
             return
         
-        success_count = 0
         total_count = len(mappings)
+        mappings = self._order_mappings(mappings)
+        deferred_count = 0
+        if self.profile_dir:
+            # Профилирование: соответствия целиком и по одному, без бюджетов запуска
+            results = [self._sync_one(index, mapping) for index, mapping in enumerate(mappings, 1)]
+            success_count = sum(1 for ok in results if ok)
+        else:
+            summary = self._run_scheduled(mappings)
+            success_count = summary['success']
+            deferred_count = summary['deferred']
         
-        for mapping in mappings:
-            try:
-                if self.sync_person_to_album(mapping):
-                    success_count += 1
-            except Exception as e:
-                logger.error(f"Ошибка при обработке соответствия: {e}", exc_info=True)
+        if self.journal is not None:
+            self.journal.close()
+            pending = self.journal.pending_batches()
+            if pending:
+                logger.warning(f"В очереди повтора батчей: {pending}")
         
+        self._log_run_profile()
         logger.info("=" * 60)
         logger.info(f"Синхронизация завершена: {success_count}/{total_count} успешно")
+        if deferred_count:
+            logger.info(f"Отложено до следующего запуска: {deferred_count}")
         logger.info("=" * 60)
 
 
-def main():
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    """Разобрать аргументы командной строки"""
+    parser = argparse.ArgumentParser(description="Синхронизация людей Immich с альбомами")
+    parser.add_argument(
+        '--profile', nargs='?', const='profiles', default=None, metavar='DIR',
+        help="Сохранять снимки cProfile/tracemalloc по каждому соответствию в DIR (по умолчанию ./profiles)"
+    )
+    parser.add_argument(
+        '--record', metavar='FILE',
+        help="Записать запросы и ответы API (без секретов) в кассету FILE (.jsonl.gz)"
+    )
+    parser.add_argument(
+        '--replay', metavar='FILE',
+        help="Воспроизвести ответы API из кассеты FILE вместо обращения к серверу"
+    )
+    parser.add_argument(
+        '--replay-speed', type=float, default=None, metavar='SCALE',
+        help="Множитель записанных задержек при воспроизведении (0 = без задержек)"
+    )
+    return parser.parse_args(argv)
+
+
+def options_from_args(args: argparse.Namespace) -> Dict:
+    """Переопределения options из аргументов командной строки"""
+    overrides = {}
+    if args.record:
+        overrides['record_cassette'] = args.record
+    if args.replay:
+        overrides['replay_cassette'] = args.replay
+    if args.replay_speed is not None:
+        overrides['replay_latency_scale'] = args.replay_speed
+    return overrides
+
+
+def main(argv: Optional[List[str]] = None):
     """Главная функция"""
+    args = parse_args(argv)
     config_path = os.environ.get('CONFIG_PATH', 'config.yaml')
     
+    sync = None
     try:
-        sync = PeopleAlbumsSync(config_path)
+        sync = PeopleAlbumsSync(config_path, profile_dir=args.profile, options_overrides=options_from_args(args))
         sync.run()
     except Exception as e:
         logger.error(f"Критическая ошибка: {e}", exc_info=True)
         sys.exit(1)
+    finally:
+        if sync is not None:
+            sync.client.close()
 
 
 if __name__ == "__main__":
     main()
-
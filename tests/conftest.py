@@ -13,3 +13,52 @@ def disable_logging():
     yield
     logging.disable(logging.NOTSET)
 
+
+
+class CountingTransport:
+    """Имитация Immich, подключаемая к requests.Session вместо сети"""
+    
+    url = "http://immich.test"
+    
+    def __init__(self, **params):
+        from bench import FakeImmich, FakeImmichAdapter
+        self.fake = FakeImmich(**params)
+        self.adapter = FakeImmichAdapter(self.fake)
+    
+    def session(self):
+        """Новая сессия requests, все запросы которой идут в имитацию"""
+        # requests.sessions.Session, а не requests.Session: последний подменяется фикстурой
+        from requests.sessions import Session
+        session = Session()
+        session.mount(self.url, self.adapter)
+        return session
+    
+    @property
+    def requests(self) -> int:
+        return self.adapter.requests
+    
+    @property
+    def bytes_received(self) -> int:
+        return self.adapter.bytes_received
+    
+    def count(self, endpoint: str) -> int:
+        return self.adapter.count(endpoint)
+    
+    def reset(self):
+        self.adapter.reset()
+
+
+@pytest.fixture
+def counting_transport(monkeypatch):
+    """Фабрика имитаций Immich; ImmichClient получает сессию со считающим транспортом"""
+    import main
+    
+    transports = []
+    
+    def factory(**params):
+        transport = CountingTransport(**params)
+        transports.append(transport)
+        monkeypatch.setattr(main.requests, 'Session', transport.session)
+        return transport
+    
+    return factory
@@ -0,0 +1,93 @@
+"""
+Тесты режима auto: альбом для каждого именованного человека
+"""
+
+import yaml
+from main import PeopleAlbumsSync
+
+
+def write_config(tmp_path, auto, mappings=None, options=None):
+    """Записать конфиг для имитации Immich"""
+    config = {
+        'immich': {'url': 'http://immich.test', 'api_key': 'bench-api-key'},
+        'mappings': mappings or [],
+        'auto': dict({'enabled': True}, **auto),
+        'options': dict({'state_dir': str(tmp_path / 'state')}, **(options or {})),
+    }
+    config_path = tmp_path / "config.yaml"
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.dump(config, f, allow_unicode=True)
+    return str(config_path)
+
+
+def album_names(fake):
+    return sorted(album['albumName'] for album in fake.albums.values())
+
+
+class TestAutoMappings:
+    """Тесты автоматических соответствий"""
+    
+    def test_album_per_named_visible_person(self, counting_transport, tmp_path):
+        """Тест: альбомы только для именованных и не скрытых людей, без запросов по ID"""
+        transport = counting_transport(assets=400, people=60, albums=0)
+        expected = sorted(f"{p['name']} — фото" for p in transport.fake.people if p['name'] and not p['isHidden'])
+        config_path = write_config(tmp_path, {'album_template': '{name} — фото'})
+        
+        PeopleAlbumsSync(config_path).run()
+        
+        assert album_names(transport.fake) == expected
+        assert transport.count('GET /api/people') == 1
+        assert transport.count('GET /api/albums') == 1
+        assert transport.count('GET /api/people/{id}') == 0
+        assert transport.count('POST /api/albums') == len(expected)
+        for album in transport.fake.albums.values():
+            person = int(album['albumName'].split()[1])
+            assert len(album['assets']) == len(transport.fake.person_assets[person])
+    
+    def test_rename_reuses_album(self, counting_transport, tmp_path):
+        """Тест: переименованный человек сохраняет свой альбом"""
+        transport = counting_transport(assets=100, people=3, albums=0)
+        config_path = write_config(tmp_path, {'album_template': 'Фото: {name}'})
+        PeopleAlbumsSync(config_path).run()
+        album_ids = set(transport.fake.albums)
+        
+        transport.fake.people[0]['name'] = 'Иван'
+        PeopleAlbumsSync(config_path).run()
+        
+        assert set(transport.fake.albums) == album_ids
+        assert 'Фото: Иван' in album_names(transport.fake)
+        assert 'Фото: Person 00000' not in album_names(transport.fake)
+    
+    def test_rename_without_album_rename(self, counting_transport, tmp_path):
+        """Тест: rename_albums: false оставляет старое название альбома"""
+        transport = counting_transport(assets=100, people=2, albums=0)
+        config_path = write_config(tmp_path, {'rename_albums': False})
+        PeopleAlbumsSync(config_path).run()
+        
+        transport.fake.people[0]['name'] = 'Иван'
+        PeopleAlbumsSync(config_path).run()
+        
+        assert album_names(transport.fake) == ['Person 00000', 'Person 00001']
+        assert transport.count('PATCH /api/albums/{id}') == 0
+    
+    def test_explicit_mappings_take_precedence(self, counting_transport, tmp_path):
+        """Тест: люди из mappings не получают второй, автоматический альбом"""
+        transport = counting_transport(assets=100, people=3, albums=0)
+        mappings = [{'person_name': 'Person 00000', 'album_name': 'Мой альбом'}]
+        config_path = write_config(tmp_path, {'exclude': ['Person 00002']}, mappings=mappings)
+        
+        PeopleAlbumsSync(config_path).run()
+        
+        assert album_names(transport.fake) == ['Person 00001', 'Мой альбом']
+    
+    def test_parallel_sync(self, counting_transport, tmp_path):
+        """Тест: параллельная синхронизация дает тот же результат"""
+        transport = counting_transport(assets=600, people=30, albums=0)
+        config_path = write_config(tmp_path, {}, options={'concurrency': 8})
+        
+        PeopleAlbumsSync(config_path).run()
+        
+        for album in transport.fake.albums.values():
+            person = int(album['albumName'].split()[1])
+            assert len(album['assets']) == len(transport.fake.person_assets[person])
+        assert transport.count('POST /api/search/metadata') == len(transport.fake.albums)
@@ -0,0 +1,78 @@
+"""
+Тесты для имитации сервера Immich и бенчмарка
+"""
+
+import json
+import pytest
+from bench import FakeImmich, BENCH_API_KEY, run_benchmark
+
+
+class TestFakeImmich:
+    """Тесты для модели FakeImmich"""
+    
+    def request(self, fake, method, url, body=None, api_key=BENCH_API_KEY):
+        """Выполнить запрос к модели и разобрать JSON-ответ"""
+        headers = {'x-api-key': api_key} if api_key else {}
+        data = json.dumps(body).encode('utf-8') if body is not None else b''
+        status, payload = fake.handle(method, url, headers, data)
+        return status, json.loads(payload)
+    
+    def test_requires_auth(self):
+        """Тест отказа без API ключа"""
+        fake = FakeImmich(assets=10, people=2, albums=1)
+        status, _ = self.request(fake, 'GET', '/api/albums', api_key=None)
+        
+        assert status == 401
+    
+    def test_search_pagination(self):
+        """Тест постраничного поиска активов человека"""
+        fake = FakeImmich(assets=2000, people=5, albums=0)
+        person_id = fake.people[0]['id']
+        expected = len(fake.person_assets[0])
+        
+        ids, page = [], 1
+        while page:
+            status, data = self.request(fake, 'POST', '/api/search/metadata',
+                                        {'personIds': [person_id], 'size': 100, 'page': page})
+            assert status == 200
+            ids.extend(item['id'] for item in data['assets']['items'])
+            page = data['assets']['nextPage'] and int(data['assets']['nextPage'])
+        
+        assert len(ids) == expected == len(set(ids))
+        assert fake.stats()['endpoints']['POST /api/search/metadata']['count'] == -(-expected // 100)
+    
+    def test_add_assets_reports_duplicates(self):
+        """Тест добавления активов в альбом с отметкой дубликатов"""
+        fake = FakeImmich(assets=10, people=1, albums=1)
+        album_id = next(iter(fake.albums))
+        asset_id = FakeImmich.asset_id(3)
+        
+        _, first = self.request(fake, 'PUT', f'/api/albums/{album_id}/assets', {'ids': [asset_id]})
+        _, second = self.request(fake, 'PUT', f'/api/albums/{album_id}/assets', {'ids': [asset_id]})
+        
+        assert first == [{'id': asset_id, 'success': True}]
+        assert second == [{'id': asset_id, 'success': False, 'error': 'duplicate'}]
+    
+    def test_injected_errors(self):
+        """Тест внедрения ошибок сервера"""
+        fake = FakeImmich(assets=10, people=1, albums=1, error_rate=1.0)
+        status, _ = self.request(fake, 'GET', '/api/albums')
+        
+        assert status == 500
+        assert fake.stats()['errors_injected'] == 1
+
+
+class TestRunBenchmark:
+    """Тесты для запуска бенчмарка"""
+    
+    def test_run_benchmark_in_process(self):
+        """Тест полного прогона: холодный и повторный запуск"""
+        report = run_benchmark(assets=500, people=20, albums=2, mappings=3, runs=2, in_process=True)
+        
+        cold, steady = report['runs']
+        assert cold['requests'] > 0
+        assert 'PUT /api/albums/{id}/assets' in cold['endpoints']
+        # Во втором запуске добавлять уже нечего
+        assert 'PUT /api/albums/{id}/assets' not in steady['endpoints']
+        assert 'POST /api/albums' not in steady['endpoints']
+        assert report['client_peak_rss_kb'] >= 0
@@ -2,10 +2,14 @@
 Тесты для ImmichClient
 """
 
+import gzip
+import json
 import pytest
 from unittest.mock import Mock, patch, MagicMock
 import requests
-from main import ImmichClient
+from datetime import date
+from main import ImmichClient, RequestMetrics, SearchIdStreamDecoder, build_search_filters
+from bench import FakeImmich
 
 
 class TestImmichClient:
@@ -322,3 +326,314 @@ class TestImmichClient:
             assert result is True
             assert mock_session_instance.put.call_count == 3
 
+    
+    def test_request_metrics(self):
+        """Тест учета запросов и трафика по эндпоинтам"""
+        with patch('main.requests.Session') as mock_session:
+            mock_session_instance = Mock()
+            mock_response = Mock()
+            mock_response.json.return_value = {'id': 'album1', 'assets': [{'id': 'asset1'}]}
+            mock_response.content = b'{"id": "album1", "assets": [{"id": "asset1"}]}'
+            mock_response.raise_for_status = Mock()
+            mock_session_instance.get.return_value = mock_response
+            mock_session_instance.headers = {}
+            mock_session.return_value = mock_session_instance
+            
+            client = ImmichClient("http://test.com", api_key="test-key")
+            client.get_album_assets("album1")
+            client.get_album_assets("album2")
+            
+            snapshot = client.metrics.snapshot()
+            assert snapshot['requests'] == 2
+            assert snapshot['bytes_received'] == 2 * len(mock_response.content)
+            assert snapshot['endpoints']['GET /albums/{id}']['count'] == 2
+            assert client.metrics.thread_snapshot()['requests'] == 2
+    
+    def test_slow_request_logged(self):
+        """Тест записи медленного запроса в отдельный лог"""
+        with patch('main.requests.Session') as mock_session:
+            mock_session_instance = Mock()
+            mock_response = Mock()
+            mock_response.json.return_value = []
+            mock_response.raise_for_status = Mock()
+            mock_session_instance.get.return_value = mock_response
+            mock_session_instance.headers = {}
+            mock_session.return_value = mock_session_instance
+            
+            client = ImmichClient("http://test.com", api_key="test-key", slow_request_threshold=0.5)
+            with patch('main.time.perf_counter', side_effect=[0.0, 1.0, 1.0, 1.0]), \
+                    patch('main.slow_logger') as mock_slow_logger:
+                client.get_all_albums()
+            
+            mock_slow_logger.warning.assert_called_once()
+            assert 'GET /albums' in mock_slow_logger.warning.call_args[0][0]
+            assert client.metrics.snapshot()['slow_requests'] == 1
+    
+    def test_endpoint_key(self):
+        """Тест нормализации пути запроса до шаблона эндпоинта"""
+        assert RequestMetrics.endpoint_key('get', '/albums/abc-123') == 'GET /albums/{id}'
+        assert RequestMetrics.endpoint_key('put', '/albums/abc/assets') == 'PUT /albums/{id}/assets'
+        assert RequestMetrics.endpoint_key('put', '/albums/assets') == 'PUT /albums/assets'
+        assert RequestMetrics.endpoint_key('get', '/people?size=1') == 'GET /people'
+    
+    def test_album_catalog_cached(self):
+        """Тест кэширования каталога альбомов между поисками по имени"""
+        with patch('main.requests.Session') as mock_session:
+            mock_session_instance = Mock()
+            mock_response = Mock()
+            mock_response.json.return_value = [
+                {'id': 'album1', 'albumName': 'Album 1'},
+                {'id': 'album2', 'albumName': 'Album 2'}
+            ]
+            mock_response.raise_for_status = Mock()
+            mock_session_instance.get.return_value = mock_response
+            mock_session_instance.headers = {}
+            mock_session.return_value = mock_session_instance
+            
+            client = ImmichClient("http://test.com", api_key="test-key")
+            assert client.find_album_by_name("Album 1")['id'] == 'album1'
+            assert client.find_album_by_name("Album 2")['id'] == 'album2'
+            assert mock_session_instance.get.call_count == 1
+            
+            client.get_all_albums(refresh=True)
+            assert mock_session_instance.get.call_count == 2
+    
+    def test_people_catalog_error_not_cached(self):
+        """Тест: ошибка получения людей не кэшируется"""
+        with patch('main.requests.Session') as mock_session:
+            mock_session_instance = Mock()
+            mock_response = Mock()
+            mock_response.json.return_value = {'people': [{'id': '1', 'name': 'Test'}]}
+            mock_response.raise_for_status = Mock()
+            mock_session_instance.get.side_effect = [requests.RequestException("Error"), mock_response]
+            mock_session_instance.headers = {}
+            mock_session.return_value = mock_session_instance
+            
+            client = ImmichClient("http://test.com", api_key="test-key")
+            assert client.find_person_by_name("Test") is None
+            assert client.find_person_by_name("Test")['id'] == '1'
+            assert client.find_person_by_name("Test")['id'] == '1'
+            assert mock_session_instance.get.call_count == 2
+
+
+class TestCassettes:
+    """Тесты записи и воспроизведения трафика API"""
+    
+    def test_record_scrubs_secrets(self, counting_transport, tmp_path):
+        """Тест записи кассеты без ключей, паролей и токенов"""
+        counting_transport(assets=50, people=3, albums=1)
+        cassette = tmp_path / "night.jsonl.gz"
+        
+        client = ImmichClient("http://immich.test", email="admin@example.com", password="secret",
+                              record_path=str(cassette))
+        client.session.headers['x-api-key'] = 'bench-api-key'
+        client.get_all_albums()
+        client.close()
+        
+        text = gzip.open(cassette, 'rt', encoding='utf-8').read()
+        entries = [json.loads(line) for line in text.splitlines()][1:]
+        assert [e['path'] for e in entries] == ['/api/auth/login', '/api/albums']
+        assert 'secret' not in text
+        assert 'bench-api-key' not in text
+        assert 'admin@example.com' not in text
+        assert json.loads(entries[0]['response'])['accessToken'] == '***'
+    
+    def test_replay_serves_recorded_responses(self, counting_transport, tmp_path):
+        """Тест воспроизведения: ответы из кассеты, сервер не запрашивается"""
+        transport = counting_transport(assets=300, people=3, albums=1)
+        cassette = tmp_path / "night.jsonl.gz"
+        person_id = transport.fake.people[0]['id']
+        
+        recorder = ImmichClient("http://immich.test", api_key="bench-api-key", record_path=str(cassette))
+        recorded_assets = recorder.search_assets_by_person(person_id)
+        recorded_albums = recorder.get_all_albums()
+        recorder.close()
+        requests_before = transport.requests
+        
+        replayer = ImmichClient("http://immich.test", api_key="other-key",
+                                replay_path=str(cassette), replay_latency_scale=0)
+        
+        assert replayer.search_assets_by_person(person_id) == recorded_assets
+        assert [a['id'] for a in replayer.get_all_albums()] == [a['id'] for a in recorded_albums]
+        assert replayer.get_person_by_id("unknown") is None
+        assert transport.requests == requests_before
+        assert replayer.replayer.replayed == 2
+        assert replayer.replayer.missing == 1
+    
+    def test_replay_latency_scale(self, counting_transport, tmp_path):
+        """Тест масштабирования записанных задержек"""
+        transport = counting_transport(assets=10, people=1, albums=1, latency=0.05)
+        cassette = tmp_path / "slow.jsonl.gz"
+        
+        recorder = ImmichClient("http://immich.test", api_key="bench-api-key", record_path=str(cassette))
+        recorder.get_all_albums()
+        recorder.close()
+        
+        with patch('main.time.sleep') as mock_sleep:
+            replayer = ImmichClient("http://immich.test", api_key="bench-api-key",
+                                    replay_path=str(cassette), replay_latency_scale=2.0)
+            replayer.get_all_albums()
+        
+        assert mock_sleep.call_args[0][0] >= 0.1
+
+
+class TestSearchPayload:
+    """Тесты облегченного поиска и потокового разбора ответа"""
+    
+    def test_search_requests_lean_payload(self):
+        """Тест: поиск отключает EXIF, людей и стеки в ответе"""
+        with patch('main.requests.Session') as mock_session:
+            mock_session_instance = Mock()
+            mock_response = Mock()
+            mock_response.json.return_value = {'assets': {'items': [{'id': 'asset1'}], 'nextPage': None}}
+            mock_response.raise_for_status = Mock()
+            mock_session_instance.post.return_value = mock_response
+            mock_session_instance.headers = {}
+            mock_session.return_value = mock_session_instance
+            
+            client = ImmichClient("http://test.com", api_key="test-key")
+            client.search_assets_by_person("person123")
+            
+            body = mock_session_instance.post.call_args[1]['json']
+            assert body['withExif'] is False
+            assert body['withPeople'] is False
+            assert body['withStacked'] is False
+            assert body['personIds'] == ['person123']
+    
+    def test_stream_json_matches_full_decode(self, counting_transport):
+        """Тест: потоковый разбор дает те же ID, что и полный"""
+        transport = counting_transport(assets=3000, people=3, albums=0)
+        person_id = transport.fake.people[0]['id']
+        
+        full = ImmichClient("http://immich.test", api_key="bench-api-key")
+        streamed = ImmichClient("http://immich.test", api_key="bench-api-key", stream_json=True)
+        
+        expected = full.search_assets_by_person(person_id, limit=0)
+        assert streamed.search_assets_by_person(person_id, limit=0) == expected
+        assert len(expected) == len(transport.fake.person_assets[0])
+        assert streamed.metrics.snapshot()['bytes_received'] == full.metrics.snapshot()['bytes_received']
+    
+    @pytest.mark.parametrize('chunk_size', [1, 7, 4096])
+    def test_decoder_chunking(self, chunk_size):
+        """Тест разбора при произвольном разбиении потока на части"""
+        payload = json.dumps({
+            'albums': {'items': [{'id': 'album-not-asset'}], 'total': 1},
+            'assets': {
+                'total': 12345,
+                'items': [{'name': 'ёжик', 'id': 'a1'}, {'id': 'a2', 'owner': {'id': 'nested'}}],
+                'facets': [],
+                'nextPage': '2'
+            }
+        }, indent=2, ensure_ascii=False).encode('utf-8')
+        
+        decoder = SearchIdStreamDecoder()
+        for i in range(0, len(payload), chunk_size):
+            decoder.feed(payload[i:i + chunk_size])
+        decoder.close()
+        
+        assert decoder.ids == ['a1', 'a2']
+        assert decoder.next_page == '2'
+        assert decoder.bytes == len(payload)
+    
+    def test_decoder_truncated_response(self):
+        """Тест ошибки на обрезанном ответе"""
+        decoder = SearchIdStreamDecoder()
+        decoder.feed(b'{"assets": {"items": [{"id": "a1"}, {"id": "a')
+        
+        with pytest.raises(ValueError):
+            decoder.close()
+
+
+class TestPeoplePagination:
+    """Тесты постраничного получения людей"""
+    
+    def test_get_all_people_pages(self, counting_transport):
+        """Тест: все страницы /people собираются в один список"""
+        transport = counting_transport(assets=10, people=2500, albums=0)
+        
+        client = ImmichClient("http://immich.test", api_key="bench-api-key")
+        people = client.get_all_people()
+        
+        visible = [p for p in transport.fake.people if not p['isHidden']]
+        assert [p['id'] for p in people] == [p['id'] for p in visible]
+        assert transport.count('GET /api/people') == 3
+
+
+class TestSearchFilters:
+    """Тесты фильтров поиска, передаваемых на сервер"""
+    
+    def test_build_search_filters(self):
+        """Тест преобразования фильтров конфига в поля MetadataSearchDto"""
+        filters = build_search_filters({
+            'taken_after': date(2024, 1, 1),
+            'type': 'image',
+            'is_favorite': True,
+            'visibility': 'Archive',
+            'city': 'Москва',
+            'lensModel': 'RF50',
+            'country': None
+        })
+        
+        assert filters == {
+            'takenAfter': '2024-01-01',
+            'type': 'IMAGE',
+            'isFavorite': True,
+            'visibility': 'archive',
+            'city': 'Москва',
+            'lensModel': 'RF50'
+        }
+    
+    def test_build_search_filters_errors(self):
+        """Тест ошибок в фильтрах"""
+        with pytest.raises(ValueError, match="Неизвестный фильтр"):
+            build_search_filters({'camera': 'Canon'})
+        with pytest.raises(ValueError, match="Недопустимое значение"):
+            build_search_filters({'type': 'photo'})
+    
+    def test_filters_sent_to_server(self, counting_transport):
+        """Тест: фильтрация выполняется сервером, лишние страницы не передаются"""
+        transport = counting_transport(assets=3000, people=2, albums=0)
+        person_id = transport.fake.people[0]['id']
+        client = ImmichClient("http://immich.test", api_key="bench-api-key")
+        
+        all_assets = client.search_assets_by_person(person_id, limit=0)
+        favorites = client.search_assets_by_person(person_id, limit=0, filters={'isFavorite': True})
+        
+        expected = [FakeImmich.asset_id(i) for i in reversed(transport.fake.person_assets[0]) if i % 17 == 0]
+        assert favorites == expected
+        assert 0 < len(favorites) < len(all_assets)
+
+
+class TestOrderedScan:
+    """Тесты просмотра активов сначала новых, с остановкой и лимитом"""
+    
+    def test_no_default_cap(self, counting_transport):
+        """Тест: без limit возвращаются все активы человека, а не первая тысяча"""
+        transport = counting_transport(assets=3000, people=1, albums=0)
+        client = ImmichClient("http://immich.test", api_key="bench-api-key")
+        
+        assert len(client.search_assets_by_person(transport.fake.people[0]['id'])) == 3000
+    
+    @pytest.mark.parametrize('stream_json', [False, True])
+    def test_stop_at_known_asset(self, counting_transport, stream_json):
+        """Тест: просмотр останавливается на известном активе, не запрашивая следующих страниц"""
+        transport = counting_transport(assets=3000, people=1, albums=0)
+        person_id = transport.fake.people[0]['id']
+        client = ImmichClient("http://immich.test", api_key="bench-api-key", stream_json=stream_json)
+        
+        assets = client.search_assets_by_person(person_id, order='desc', stop_at={FakeImmich.asset_id(2990)})
+        
+        assert assets == [FakeImmich.asset_id(i) for i in range(2999, 2990, -1)]
+        assert transport.count('POST /api/search/metadata') == 1
+    
+    def test_limit_counts_only_new_assets(self, counting_transport):
+        """Тест: активы из skip не учитываются в limit, лимит применяется по ходу чтения"""
+        transport = counting_transport(assets=3000, people=1, albums=0)
+        person_id = transport.fake.people[0]['id']
+        client = ImmichClient("http://immich.test", api_key="bench-api-key")
+        skip = {FakeImmich.asset_id(i) for i in range(2000)}
+        
+        assets = client.search_assets_by_person(person_id, limit=5, order='asc', skip=skip)
+        
+        assert assets == [FakeImmich.asset_id(i) for i in range(2000, 2005)]
+        assert transport.count('POST /api/search/metadata') == 3
@@ -0,0 +1,73 @@
+"""
+Тесты инкрементального просмотра: сначала новые активы, до отметки прошлого запуска
+"""
+
+from array import array
+import yaml
+from main import PeopleAlbumsSync
+
+
+def write_config(tmp_path, options=None):
+    """Конфиг с одним соответствием и инкрементальным просмотром"""
+    config = {
+        'immich': {'url': 'http://immich.test', 'api_key': 'bench-api-key'},
+        'mappings': [{'person_name': 'Person 00000', 'album_name': 'Альбом'}],
+        'options': dict({'state_dir': str(tmp_path / 'state'), 'incremental_scan': True}, **(options or {})),
+    }
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text(yaml.safe_dump(config, allow_unicode=True), encoding='utf-8')
+    return str(config_path)
+
+
+def album_size(fake):
+    return sum(len(album['assets']) for album in fake.albums.values())
+
+
+class TestIncrementalScan:
+    """Тесты инкрементального просмотра"""
+
+    def test_steady_state_reads_single_page(self, counting_transport, tmp_path):
+        """Тест: повторный запуск читает одну страницу и находит только новые активы"""
+        transport = counting_transport(assets=5000, people=1, albums=0)
+        all_assets = transport.fake.person_assets[0]
+        transport.fake.person_assets[0] = array('l', all_assets[:-50])
+        config_path = write_config(tmp_path)
+
+        PeopleAlbumsSync(config_path).run()
+        assert transport.count('POST /api/search/metadata') == 5
+        assert album_size(transport.fake) == len(all_assets) - 50
+
+        # Появились новые фото
+        transport.fake.person_assets[0] = all_assets
+        transport.reset()
+        PeopleAlbumsSync(config_path).run()
+        assert transport.count('POST /api/search/metadata') == 1
+        assert album_size(transport.fake) == len(all_assets)
+
+        # Новых фото нет: ни одного чтения альбома
+        transport.reset()
+        PeopleAlbumsSync(config_path).run()
+        assert transport.count('POST /api/search/metadata') == 1
+        assert transport.count('GET /api/albums/{id}') == 0
+        assert transport.count('PUT /api/albums/{id}/assets') == 0
+
+    def test_periodic_full_scan(self, counting_transport, tmp_path):
+        """Тест: после истечения full_scan_interval просмотр снова полный"""
+        transport = counting_transport(assets=5000, people=1, albums=0)
+        config_path = write_config(tmp_path, {'full_scan_interval': 1e-9})
+
+        PeopleAlbumsSync(config_path).run()
+        transport.reset()
+        PeopleAlbumsSync(config_path).run()
+
+        assert transport.count('POST /api/search/metadata') == 5
+
+    def test_truncated_run_keeps_marker(self, counting_transport, tmp_path):
+        """Тест: активы, не вошедшие в max_assets_per_run, находятся следующим запуском"""
+        transport = counting_transport(assets=1000, people=1, albums=0)
+        config_path = write_config(tmp_path, {'max_assets_per_run': 300})
+
+        for _ in range(4):
+            PeopleAlbumsSync(config_path).run()
+
+        assert album_size(transport.fake) == len(transport.fake.person_assets[0])
@@ -0,0 +1,104 @@
+"""
+Тесты журнала батчей: возобновление прерванного запуска и очередь повтора
+"""
+
+import json
+import pytest
+import yaml
+from main import ImmichClient, PeopleAlbumsSync, StateStore, SyncJournal
+
+
+def write_config(tmp_path):
+    """Конфиг с одним соответствием и каталогом состояния"""
+    config = {
+        'immich': {'url': 'http://immich.test', 'api_key': 'bench-api-key'},
+        'mappings': [{'person_name': 'Person 00000', 'album_name': 'Альбом'}],
+        'options': {'state_dir': str(tmp_path / 'state')},
+    }
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text(yaml.safe_dump(config, allow_unicode=True), encoding='utf-8')
+    return str(config_path)
+
+
+def album_assets(fake):
+    album = next(a for a in fake.albums.values() if a['albumName'] == 'Альбом')
+    return len(album['assets'])
+
+
+class TestSyncJournal:
+    """Тесты журнала упреждающей записи"""
+
+    def test_resume_interrupted_run(self, counting_transport, tmp_path, monkeypatch):
+        """Тест: после аварийной остановки запуск продолжается без повторного поиска"""
+        transport = counting_transport(assets=1000, people=1, albums=0)
+        config_path = write_config(tmp_path)
+        original = ImmichClient.add_assets_to_album
+        calls = []
+
+        def killed_after_three(client, album_id, asset_ids):
+            if len(calls) == 3:
+                raise SystemExit("контейнер остановлен")
+            calls.append(asset_ids)
+            return original(client, album_id, asset_ids)
+
+        monkeypatch.setattr(ImmichClient, 'add_assets_to_album', killed_after_three)
+        with pytest.raises(SystemExit):
+            PeopleAlbumsSync(config_path).run()
+        assert album_assets(transport.fake) == 300
+
+        monkeypatch.setattr(ImmichClient, 'add_assets_to_album', original)
+        transport.reset()
+        PeopleAlbumsSync(config_path).run()
+
+        assert album_assets(transport.fake) == 1000
+        assert transport.count('POST /api/search/metadata') == 0
+        assert transport.count('PUT /api/albums/{id}/assets') == 7
+        assert (tmp_path / 'state' / 'journal.jsonl').read_text() == ''
+
+    def test_failed_batch_retried_next_run(self, counting_transport, tmp_path, monkeypatch):
+        """Тест: неудавшийся батч не проваливает соответствие и повторяется следующим запуском"""
+        transport = counting_transport(assets=500, people=1, albums=0)
+        config_path = write_config(tmp_path)
+        original = ImmichClient.add_assets_to_album
+        calls = []
+
+        def second_batch_fails(client, album_id, asset_ids):
+            calls.append(asset_ids)
+            if len(calls) == 2:
+                return False
+            return original(client, album_id, asset_ids)
+
+        monkeypatch.setattr(ImmichClient, 'add_assets_to_album', second_batch_fails)
+        sync = PeopleAlbumsSync(config_path)
+        assert sync.sync_person_to_album(sync.config['mappings'][0]) is True
+        sync.journal.close()
+        assert album_assets(transport.fake) == 400
+        assert sync.journal.pending_batches() == 1
+
+        monkeypatch.setattr(ImmichClient, 'add_assets_to_album', original)
+        transport.reset()
+        PeopleAlbumsSync(config_path).run()
+
+        assert album_assets(transport.fake) == 500
+        assert transport.count('PUT /api/albums/{id}/assets') == 1
+
+    def test_torn_record_ignored(self, tmp_path):
+        """Тест: оборванная последняя запись журнала не мешает восстановлению"""
+        state = StateStore(str(tmp_path))
+        lines = [
+            {'op': 'plan', 'key': 'p:a', 'album_id': 'a', 'batches': {'0': ['x'], '1': ['y'], '2': ['z']}},
+            {'op': 'commit', 'key': 'p:a', 'batch': 0},
+            {'op': 'fail', 'key': 'p:a', 'batch': 1},
+        ]
+        with open(state.path(SyncJournal.FILE), 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(line) + '\n' for line in lines)
+            f.write('{"op": "commit", "key": "p:a", "ba')
+
+        journal = SyncJournal(state)
+
+        assert journal.outstanding('p:a') == {
+            1: {'ids': ['y'], 'status': 'failed', 'attempts': 1},
+            2: {'ids': ['z'], 'status': 'planned', 'attempts': 0},
+        }
+        # После сжатия состояние читается так же
+        assert SyncJournal(state).outstanding('p:a') == journal.outstanding('p:a')
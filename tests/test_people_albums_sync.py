@@ -424,3 +424,132 @@ class TestPeopleAlbumsSync:
         finally:
             os.unlink(config_path)
 
+    
+    def test_sync_records_phases(self):
+        """Тест замера времени по фазам синхронизации"""
+        config = {
+            'immich': {
+                'url': 'http://test.com',
+                'api_key': 'test-key'
+            },
+            'mappings': [],
+            'options': {}
+        }
+        
+        config_path = self.create_test_config(config)
+        
+        try:
+            with patch('main.ImmichClient') as mock_client_class:
+                mock_client = Mock()
+                mock_client_class.return_value = mock_client
+                mock_client.find_person_by_name.return_value = {'id': 'person1', 'name': 'Ivan'}
+                mock_client.find_album_by_name.return_value = {'id': 'album1', 'albumName': 'Album Ivan'}
+                mock_client.search_assets_by_person.return_value = ['asset1']
+                mock_client.get_album_assets.return_value = []
+                mock_client.add_assets_to_album.return_value = True
+                
+                sync = PeopleAlbumsSync(config_path)
+                sync.sync_person_to_album({'person_name': 'Ivan', 'album_name': 'Album Ivan'})
+                
+                phases = sync.profiler.mappings['Ivan -> Album Ivan']
+                assert set(phases) == {'resolve_person', 'resolve_album', 'search', 'diff', 'write'}
+                assert all(p['wall'] >= 0 and p['cpu'] >= 0 for p in phases.values())
+        finally:
+            os.unlink(config_path)
+    
+    def test_run_with_profile_dumps_snapshots(self, tmp_path):
+        """Тест режима --profile: снимки cProfile и tracemalloc по каждому соответствию"""
+        config = {
+            'immich': {
+                'url': 'http://test.com',
+                'api_key': 'test-key'
+            },
+            'mappings': [
+                {
+                    'person_name': 'Ivan',
+                    'album_name': 'Album Ivan'
+                }
+            ],
+            'options': {}
+        }
+        
+        config_path = self.create_test_config(config)
+        
+        try:
+            with patch('main.ImmichClient') as mock_client_class:
+                mock_client = Mock()
+                mock_client_class.return_value = mock_client
+                mock_client.find_person_by_name.return_value = {'id': 'person1', 'name': 'Ivan'}
+                mock_client.find_album_by_name.return_value = {'id': 'album1', 'albumName': 'Album Ivan'}
+                mock_client.search_assets_by_person.return_value = []
+                
+                profile_dir = tmp_path / 'profiles'
+                sync = PeopleAlbumsSync(config_path, profile_dir=str(profile_dir))
+                sync.run()
+                
+                files = sorted(p.name for p in profile_dir.iterdir())
+                assert files == ['001-Ivan_-_Album_Ivan.prof', '001-Ivan_-_Album_Ivan.tracemalloc.txt']
+        finally:
+            os.unlink(config_path)
+    
+    def test_sync_passes_mapping_filters(self):
+        """Тест: фильтры options и соответствия передаются в поиск"""
+        config = {
+            'immich': {
+                'url': 'http://test.com',
+                'api_key': 'test-key'
+            },
+            'mappings': [],
+            'options': {'filters': {'type': 'IMAGE', 'is_favorite': False}}
+        }
+        
+        config_path = self.create_test_config(config)
+        
+        try:
+            with patch('main.ImmichClient') as mock_client_class:
+                mock_client = Mock()
+                mock_client_class.return_value = mock_client
+                mock_client.find_person_by_name.return_value = {'id': 'person1', 'name': 'Ivan'}
+                mock_client.find_album_by_name.return_value = {'id': 'album1', 'albumName': 'Album'}
+                mock_client.search_assets_by_person.return_value = []
+                
+                sync = PeopleAlbumsSync(config_path)
+                mapping = {
+                    'person_name': 'Ivan',
+                    'album_name': 'Album',
+                    'filters': {'is_favorite': True, 'taken_after': '2020-01-01'}
+                }
+                
+                assert sync.sync_person_to_album(mapping) is True
+                mock_client.search_assets_by_person.assert_called_once_with(
+                    'person1',
+                    filters={'type': 'IMAGE', 'isFavorite': True, 'takenAfter': '2020-01-01'}
+                )
+        finally:
+            os.unlink(config_path)
+    
+    def test_sync_invalid_filters(self):
+        """Тест: соответствие с ошибкой в фильтрах не синхронизируется"""
+        config = {
+            'immich': {
+                'url': 'http://test.com',
+                'api_key': 'test-key'
+            },
+            'mappings': [],
+            'options': {}
+        }
+        
+        config_path = self.create_test_config(config)
+        
+        try:
+            with patch('main.ImmichClient') as mock_client_class:
+                mock_client = Mock()
+                mock_client_class.return_value = mock_client
+                
+                sync = PeopleAlbumsSync(config_path)
+                mapping = {'person_name': 'Ivan', 'album_name': 'Album', 'filters': {'camera': 'Canon'}}
+                
+                assert sync.sync_person_to_album(mapping) is False
+                mock_client.search_assets_by_person.assert_not_called()
+        finally:
+            os.unlink(config_path)
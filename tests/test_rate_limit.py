@@ -0,0 +1,122 @@
+"""
+Тесты ограничения скорости и адаптивного параллелизма запросов
+"""
+
+import threading
+from main import AdaptiveConcurrency, ImmichClient, TokenBucket
+
+
+class FakeClock:
+    """Часы, которые идут только во время sleep"""
+
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket:
+    """Тесты ведра токенов"""
+
+    def test_rate(self):
+        """Тест: после исчерпания запаса запросы идут не чаще rate в секунду"""
+        clock = FakeClock()
+        bucket = TokenBucket(5, capacity=1, clock=clock, sleep=clock.sleep)
+
+        for _ in range(6):
+            bucket.acquire()
+
+        assert abs(clock.now - 1.0) < 1e-9
+
+    def test_debt(self):
+        """Тест: списанные задним числом байты отрабатываются ожиданием"""
+        clock = FakeClock()
+        bucket = TokenBucket(100, clock=clock, sleep=clock.sleep)
+
+        bucket.charge(300)
+        bucket.acquire(0)
+
+        assert abs(clock.now - 2.0) < 1e-9
+        assert abs(bucket.waited - 2.0) < 1e-9
+
+
+class TestAdaptiveConcurrency:
+    """Тесты AIMD-регулятора"""
+
+    def test_additive_increase(self):
+        """Тест: при низкой задержке лимит растет на 1 за окно"""
+        controller = AdaptiveConcurrency(8, target_latency=0.5, window=5)
+        assert controller.limit == 4
+        for _ in range(10):
+            controller.acquire()
+            controller.release(0.1)
+
+        assert controller.limit == 6
+
+    def test_multiplicative_decrease(self):
+        """Тест: высокая задержка или ошибка сервера уменьшают лимит вдвое"""
+        controller = AdaptiveConcurrency(16, target_latency=0.5, window=5)
+        for _ in range(5):
+            controller.acquire()
+            controller.release(2.0)
+        assert controller.limit == 4
+
+        controller.acquire()
+        controller.release(0.1, ok=False)
+        assert controller.limit == 2
+        assert controller.decreases == 2
+
+    def test_single_decrease_for_in_flight_errors(self):
+        """Тест: ошибки уже отправленных запросов не снижают лимит повторно"""
+        controller = AdaptiveConcurrency(8, window=5)
+        for _ in range(4):
+            controller.acquire()
+        for _ in range(4):
+            controller.release(0.1, ok=False)
+
+        assert controller.limit == 2
+        assert controller.decreases == 1
+
+    def test_acquire_blocks_at_limit(self):
+        """Тест: сверх лимита запрос ждет освобождения слота"""
+        controller = AdaptiveConcurrency(2)
+        controller.acquire()
+        acquired = threading.Event()
+
+        thread = threading.Thread(target=lambda: (controller.acquire(), acquired.set()))
+        thread.start()
+        assert not acquired.wait(0.05)
+
+        controller.release(0.1)
+        assert acquired.wait(1)
+        thread.join()
+
+
+class TestClientLimits:
+    """Тесты лимитов в ImmichClient"""
+
+    def test_server_errors_back_off(self, counting_transport):
+        """Тест: ответы 5xx снижают параллелизм до минимума"""
+        counting_transport(people=5, error_rate=1.0)
+        client = ImmichClient("http://immich.test", api_key="bench-api-key", adaptive_concurrency=8)
+
+        for _ in range(5):
+            client.get_all_people(refresh=True)
+
+        assert client.concurrency.limit == 1
+        assert client.concurrency.in_flight == 0
+
+    def test_bandwidth_charged(self, counting_transport):
+        """Тест: полученные байты списываются с лимита полосы"""
+        transport = counting_transport(people=50)
+        client = ImmichClient("http://immich.test", api_key="bench-api-key", bandwidth_limit=10 ** 9)
+
+        client.get_all_people()
+
+        assert client.bandwidth_limiter._tokens <= 10 ** 9 - transport.bytes_received
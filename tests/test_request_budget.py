@@ -0,0 +1,95 @@
+"""
+Тесты бюджета HTTP-запросов синхронизации
+
+Запросы идут в имитацию Immich через считающий транспорт (фикстура counting_transport),
+поэтому возврат к запросам каталогов на каждое соответствие ломает эти тесты.
+"""
+
+import yaml
+from main import PeopleAlbumsSync
+
+
+def write_config(tmp_path, mappings, options=None):
+    """Записать конфиг для имитации Immich"""
+    config = {
+        'immich': {'url': 'http://immich.test', 'api_key': 'bench-api-key'},
+        'mappings': mappings,
+        'options': dict({'skip_existing': True, 'max_assets_per_run': 0}, **(options or {})),
+    }
+    config_path = tmp_path / "config.yaml"
+    with open(config_path, 'w', encoding='utf-8') as f:
+        yaml.dump(config, f, allow_unicode=True)
+    return str(config_path)
+
+
+def put_batches(fake, people):
+    """Сколько PUT-батчей по 100 активов нужно, чтобы добавить все активы людей"""
+    return sum(-(-len(fake.person_assets[p]) // 100) for p in people)
+
+
+def name_people(fake):
+    """Дать имена всем людям имитации (по умолчанию часть людей без имени)"""
+    for index, person in enumerate(fake.people):
+        person['name'] = f"Person {index:05d}"
+        person['isHidden'] = False
+
+
+class TestRequestBudget:
+    """Сколько запросов стоит синхронизация в типичных сценариях"""
+    
+    def test_cold_run_10_mappings(self, counting_transport, tmp_path):
+        """Первый запуск: 10 человек, альбомы создаются, все активы добавляются"""
+        transport = counting_transport(assets=500, people=10, albums=0)
+        name_people(transport.fake)
+        mappings = [{'person_name': f"Person {p:05d}", 'album_name': f"Album {p}"} for p in range(10)]
+        config_path = write_config(tmp_path, mappings)
+        
+        PeopleAlbumsSync(config_path).run()
+        
+        # people + albums + по 3 запроса на соответствие (create, search, album) + батчи PUT
+        assert transport.requests <= 2 + 3 * 10 + put_batches(transport.fake, range(10))
+        assert transport.count('GET /api/people') == 1
+        assert transport.count('GET /api/albums') == 1
+        assert transport.count('POST /api/albums') == 10
+        assert transport.bytes_received <= 650_000
+    
+    def test_steady_state_100_mappings_10_people(self, counting_transport, tmp_path):
+        """Повторный запуск: 100 соответствий на 10 человек, добавлять нечего"""
+        transport = counting_transport(assets=500, people=10, albums=100)
+        name_people(transport.fake)
+        mappings = [
+            {'person_name': f"Person {m % 10:05d}", 'album_name': f"Album {m:05d}"}
+            for m in range(100)
+        ]
+        config_path = write_config(tmp_path, mappings)
+        PeopleAlbumsSync(config_path).run()
+        transport.reset()
+        
+        PeopleAlbumsSync(config_path).run()
+        
+        # people + albums + поиск на человека + содержимое альбома на соответствие
+        assert transport.requests <= 2 + 10 + 100
+        assert transport.count('GET /api/people') == 1
+        assert transport.count('GET /api/albums') == 1
+        assert transport.count('POST /api/search/metadata') == 10
+        assert transport.count('PUT /api/albums/{id}/assets') == 0
+        assert transport.bytes_received <= 9_000_000
+    
+    def test_mappings_by_id(self, counting_transport, tmp_path):
+        """Соответствия с person_id/album_id: человек запрашивается один раз за запуск"""
+        transport = counting_transport(assets=200, people=2, albums=5)
+        person_id = transport.fake.people[0]['id']
+        mappings = [
+            {'person_id': person_id, 'person_name': 'P', 'album_id': album_id, 'album_name': 'A'}
+            for album_id in transport.fake.albums
+        ]
+        config_path = write_config(tmp_path, mappings)
+        
+        PeopleAlbumsSync(config_path).run()
+        
+        assert transport.count('GET /api/people/{id}') == 1
+        assert transport.count('GET /api/albums') == 1
+        assert transport.count('POST /api/search/metadata') == 1
+        batches = put_batches(transport.fake, [0])
+        assert transport.count('PUT /api/albums/{id}/assets') == 5 * batches
+        assert transport.requests <= 1 + 1 + 1 + 5 * (1 + batches)
@@ -0,0 +1,81 @@
+"""
+Тесты бюджета запуска и очередности соответствий
+"""
+
+import yaml
+from main import PeopleAlbumsSync
+
+
+def write_config(tmp_path, options, mappings=None):
+    """Конфиг с двумя соответствиями: большой (Person 00000) и малый (Person 00001) человек"""
+    config = {
+        'immich': {'url': 'http://immich.test', 'api_key': 'bench-api-key'},
+        'mappings': mappings or [
+            {'person_name': 'Person 00000', 'album_name': 'Большой'},
+            {'person_name': 'Person 00001', 'album_name': 'Малый'},
+        ],
+        'options': dict({'state_dir': str(tmp_path / 'state')}, **options),
+    }
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text(yaml.safe_dump(config, allow_unicode=True), encoding='utf-8')
+    return str(config_path)
+
+
+def album_sizes(fake):
+    return {album['albumName']: len(album['assets']) for album in fake.albums.values()}
+
+
+class TestRunBudget:
+    """Тесты бюджета запуска"""
+
+    def test_asset_budget_round_robin(self, counting_transport, tmp_path):
+        """Тест: большой человек не забирает весь бюджет, остаток дописывается следующим запуском"""
+        transport = counting_transport(assets=1000, people=2, albums=0)
+        big, small = (len(assets) for assets in transport.fake.person_assets)
+        config_path = write_config(tmp_path, {'run_asset_budget': 400})
+
+        PeopleAlbumsSync(config_path).run()
+
+        assert album_sizes(transport.fake) == {'Большой': 200, 'Малый': small}
+
+        transport.reset()
+        PeopleAlbumsSync(write_config(tmp_path, {})).run()
+
+        assert album_sizes(transport.fake) == {'Большой': big, 'Малый': small}
+        # Незавершенный план дописан из журнала, поиск только для завершенного соответствия
+        assert transport.count('POST /api/search/metadata') == 1
+
+    def test_time_budget_stops_cleanly(self, counting_transport, tmp_path):
+        """Тест: исчерпанный бюджет времени останавливает запуск до поиска"""
+        transport = counting_transport(assets=300, people=2, albums=0)
+        config_path = write_config(tmp_path, {'run_time_budget': 1e-9})
+
+        PeopleAlbumsSync(config_path).run()
+
+        assert transport.count('POST /api/search/metadata') == 0
+        assert transport.fake.albums == {}
+
+    def test_order_by_priority_and_staleness(self, counting_transport, tmp_path):
+        """Тест: сначала высокий приоритет, затем давно не синхронизированные"""
+        counting_transport(assets=300, people=3, albums=0)
+        mappings = [
+            {'person_name': 'Person 00000', 'album_name': 'A'},
+            {'person_name': 'Person 00001', 'album_name': 'B'},
+            {'person_name': 'Person 00002', 'album_name': 'C', 'priority': 1},
+        ]
+        sync = PeopleAlbumsSync(write_config(tmp_path, {}, mappings))
+        sync.state.save_json('last-sync.json', {'Person 00000 -> A': 100.0})
+
+        ordered = sync._order_mappings(mappings)
+
+        assert [m['album_name'] for m in ordered] == ['C', 'B', 'A']
+
+    def test_completed_mappings_recorded(self, counting_transport, tmp_path):
+        """Тест: время синхронизации завершенных соответствий сохраняется"""
+        counting_transport(assets=300, people=2, albums=0)
+        sync = PeopleAlbumsSync(write_config(tmp_path, {}))
+
+        sync.run()
+
+        last_sync = sync.state.load_json('last-sync.json', {})
+        assert set(last_sync) == {'Person 00000 -> Большой', 'Person 00001 -> Малый'}
@@ -0,0 +1,72 @@
+"""
+Тесты ожидания очередей распознавания лиц перед синхронизацией
+"""
+
+import yaml
+import main
+from main import PeopleAlbumsSync
+
+
+def write_config(tmp_path, options=None):
+    """Конфиг с двумя соответствиями и ожиданием очередей"""
+    config = {
+        'immich': {'url': 'http://immich.test', 'api_key': 'bench-api-key'},
+        'mappings': [
+            {'person_name': 'Person 00000', 'album_name': 'A'},
+            {'person_name': 'Person 00001', 'album_name': 'B'},
+        ],
+        'options': dict({'wait_for_jobs': True, 'job_poll_interval': 5}, **(options or {})),
+    }
+    config_path = tmp_path / 'config.yaml'
+    config_path.write_text(yaml.safe_dump(config, allow_unicode=True), encoding='utf-8')
+    return str(config_path)
+
+
+class TestWaitForJobs:
+    """Тесты ожидания задач распознавания лиц"""
+
+    def test_sync_starts_after_queues_drain(self, counting_transport, tmp_path, monkeypatch):
+        """Тест: пока очереди заняты, к поиску и альбомам не обращаемся"""
+        transport = counting_transport(assets=300, people=2, albums=0)
+        transport.fake.jobs['facialRecognition'] = 3
+        sleeps = []
+
+        def fake_sleep(seconds):
+            assert transport.count('POST /api/search/metadata') == 0
+            sleeps.append(seconds)
+            transport.fake.jobs['facialRecognition'] -= 1
+
+        monkeypatch.setattr(main.time, 'sleep', fake_sleep)
+        PeopleAlbumsSync(write_config(tmp_path)).run()
+
+        assert sleeps == [5, 5, 5]
+        assert transport.count('GET /api/jobs') == 4
+        assert len(transport.fake.albums) == 2
+
+    def test_no_permission_proceeds(self, counting_transport, tmp_path, monkeypatch):
+        """Тест: без права job.read синхронизация идет без ожидания и без повторных проверок"""
+        transport = counting_transport(assets=300, people=2, albums=0)
+        transport.fake.jobs = None
+        sleeps = []
+        monkeypatch.setattr(main.time, 'sleep', sleeps.append)
+
+        PeopleAlbumsSync(write_config(tmp_path, {'job_poll_interval': 0})).run()
+
+        assert sleeps == []
+        assert transport.count('GET /api/jobs') == 1
+        assert len(transport.fake.albums) == 2
+
+    def test_timeout_throttles_writes(self, counting_transport, tmp_path, monkeypatch):
+        """Тест: если очереди не опустели за job_wait_timeout, запись идет с паузами"""
+        transport = counting_transport(assets=1000, people=2, albums=0)
+        transport.fake.jobs['faceDetection'] = 10
+        sleeps = []
+        monkeypatch.setattr(main.time, 'sleep', sleeps.append)
+        options = {'job_wait_timeout': 1, 'job_throttle_delay': 0.5, 'concurrency': 4}
+
+        PeopleAlbumsSync(write_config(tmp_path, options)).run()
+
+        put_count = transport.count('PUT /api/albums/{id}/assets')
+        assert sleeps == [0.5] * put_count
+        assert sum(len(album['assets']) for album in transport.fake.albums.values()) == \
+            sum(len(assets) for assets in transport.fake.person_assets)